@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, load_only, defer
 from sqlalchemy import and_
 from typing import List, Optional
 from datetime import datetime, timedelta
+import csv
+import io
+import json
 
 from app.core.database import get_db
 from app.core.auth import get_current_user
@@ -17,6 +21,10 @@ from app.schemas.analytics import (
 
 router = APIRouter()
 
+# History exports are streamed: rows are read in batches and sent in chunks of about this size
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
 @router.get("/dashboard", response_model=AnalyticsDashboard)
 async def get_analytics_dashboard(
     current_user: User = Depends(get_current_user),
@@ -25,12 +33,14 @@ async def get_analytics_dashboard(
     """Get comprehensive analytics dashboard for the current user"""
     try:
         dashboard = await AnalyticsService.get_analytics_dashboard(db, current_user.id)
-        return dashboard
+        # The dashboard is already a validated AnalyticsDashboard; pydantic's own JSON
+        # serializer skips the response_model re-validation and jsonable_encoder pass
+        return Response(content=dashboard.model_dump_json(), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load analytics dashboard: {str(e)}")
 
 @router.get("/progress", response_model=UserProgressSchema)
-async def get_user_progress(
+def get_user_progress(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -48,7 +58,7 @@ async def get_user_progress(
         raise HTTPException(status_code=500, detail=f"Failed to load user progress: {str(e)}")
 
 @router.get("/history", response_model=List[QuizHistorySchema])
-async def get_quiz_history(
+def get_quiz_history(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     limit: int = Query(20, ge=1, le=100),
@@ -60,7 +70,13 @@ async def get_quiz_history(
 ):
     """Get quiz history with filtering options"""
     try:
-        query = db.query(QuizHistory).filter(QuizHistory.user_id == current_user.id)
+        # Rows written at quiz generation have no results yet. The question summary kept
+        # for repetition avoidance is not part of the response, so it is not read.
+        query = db.query(QuizHistory).options(
+            defer(QuizHistory.questions_summary), defer(QuizHistory.created_at)
+        ).filter(
+            and_(QuizHistory.user_id == current_user.id, QuizHistory.completed_at.isnot(None))
+        )
         
         if topic:
             query = query.filter(QuizHistory.topic.ilike(f"%{topic}%"))
@@ -80,7 +96,7 @@ async def get_quiz_history(
         raise HTTPException(status_code=500, detail=f"Failed to load quiz history: {str(e)}")
 
 @router.get("/history/{quiz_id}", response_model=QuizHistorySchema)
-async def get_quiz_detail(
+def get_quiz_detail(
     quiz_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -88,7 +104,11 @@ async def get_quiz_detail(
     """Get detailed information about a specific quiz"""
     try:
         quiz_history = db.query(QuizHistory).filter(
-            and_(QuizHistory.id == quiz_id, QuizHistory.user_id == current_user.id)
+            and_(
+                QuizHistory.id == quiz_id,
+                QuizHistory.user_id == current_user.id,
+                QuizHistory.completed_at.isnot(None)
+            )
         ).first()
         
         if not quiz_history:
@@ -99,7 +119,7 @@ async def get_quiz_detail(
         raise HTTPException(status_code=500, detail=f"Failed to load quiz details: {str(e)}")
 
 @router.get("/topics", response_model=List[TopicAnalyticsSchema])
-async def get_topic_analytics(
+def get_topic_analytics(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -111,7 +131,7 @@ async def get_topic_analytics(
         raise HTTPException(status_code=500, detail=f"Failed to load topic analytics: {str(e)}")
 
 @router.get("/topics/{topic}", response_model=TopicAnalyticsSchema)
-async def get_topic_detail(
+def get_topic_detail(
     topic: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -130,7 +150,7 @@ async def get_topic_detail(
         raise HTTPException(status_code=500, detail=f"Failed to load topic details: {str(e)}")
 
 @router.get("/difficulty", response_model=List[DifficultyAnalyticsSchema])
-async def get_difficulty_analytics(
+def get_difficulty_analytics(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -142,7 +162,7 @@ async def get_difficulty_analytics(
         raise HTTPException(status_code=500, detail=f"Failed to load difficulty analytics: {str(e)}")
 
 @router.get("/trends", response_model=List[PerformanceTrend])
-async def get_performance_trends(
+def get_performance_trends(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     days: int = Query(30, ge=7, le=365),
@@ -164,7 +184,7 @@ async def get_performance_trends(
         raise HTTPException(status_code=500, detail=f"Failed to load performance trends: {str(e)}")
 
 @router.get("/weak-areas", response_model=List[WeakAreaAnalysis])
-async def get_weak_areas_analysis(
+def get_weak_areas_analysis(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -176,7 +196,7 @@ async def get_weak_areas_analysis(
         raise HTTPException(status_code=500, detail=f"Failed to load weak areas analysis: {str(e)}")
 
 @router.get("/recommendations", response_model=List[LearningRecommendation])
-async def get_learning_recommendations(
+def get_learning_recommendations(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -196,7 +216,7 @@ async def get_learning_recommendations(
         raise HTTPException(status_code=500, detail=f"Failed to load recommendations: {str(e)}")
 
 @router.get("/stats/summary")
-async def get_stats_summary(
+def get_stats_summary(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -206,16 +226,16 @@ async def get_stats_summary(
         if not user_progress:
             raise HTTPException(status_code=404, detail="User progress not found")
         
-        # Get recent quiz performance
-        recent_quizzes = db.query(QuizHistory).filter(
-            QuizHistory.user_id == current_user.id
+        # Get recent quiz performance (only the scores are used)
+        recent_quizzes = db.query(QuizHistory).options(load_only(QuizHistory.score)).filter(
+            and_(QuizHistory.user_id == current_user.id, QuizHistory.completed_at.isnot(None))
         ).order_by(QuizHistory.completed_at.desc()).limit(10).all()
         
-        # Calculate improvement trends
-        if len(recent_quizzes) >= 2:
-            recent_avg = sum(q.score for q in recent_quizzes[:5]) / min(5, len(recent_quizzes))
-            older_avg = sum(q.score for q in recent_quizzes[5:10]) / min(5, len(recent_quizzes[5:]))
-            improvement = recent_avg - older_avg if len(recent_quizzes) >= 10 else 0
+        # Calculate improvement trends (latest 5 against the 5 before them)
+        if len(recent_quizzes) >= 10:
+            recent_avg = sum(q.score for q in recent_quizzes[:5]) / 5
+            older_avg = sum(q.score for q in recent_quizzes[5:10]) / 5
+            improvement = recent_avg - older_avg
         else:
             improvement = 0
         
@@ -240,7 +260,7 @@ async def get_stats_summary(
         raise HTTPException(status_code=500, detail=f"Failed to load stats summary: {str(e)}")
 
 @router.get("/stats/comparison")
-async def get_performance_comparison(
+def get_performance_comparison(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     period: str = Query("month", regex="^(week|month|quarter|year)$")
@@ -262,8 +282,11 @@ async def get_performance_comparison(
             current_start = now - timedelta(days=365)
             previous_start = current_start - timedelta(days=365)
         
+        # Only these columns are compared, not the per-quiz breakdowns
+        period_columns = load_only(QuizHistory.score, QuizHistory.accuracy, QuizHistory.time_taken)
+        
         # Get current period quizzes
-        current_quizzes = db.query(QuizHistory).filter(
+        current_quizzes = db.query(QuizHistory).options(period_columns).filter(
             and_(
                 QuizHistory.user_id == current_user.id,
                 QuizHistory.completed_at >= current_start,
@@ -272,7 +295,7 @@ async def get_performance_comparison(
         ).all()
         
         # Get previous period quizzes
-        previous_quizzes = db.query(QuizHistory).filter(
+        previous_quizzes = db.query(QuizHistory).options(period_columns).filter(
             and_(
                 QuizHistory.user_id == current_user.id,
                 QuizHistory.completed_at >= previous_start,
@@ -311,24 +334,31 @@ async def get_performance_comparison(
         raise HTTPException(status_code=500, detail=f"Failed to load performance comparison: {str(e)}")
 
 @router.get("/export/history")
-async def export_quiz_history(
+def export_quiz_history(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     format: str = Query("json", regex="^(json|csv)$")
 ):
-    """Export quiz history in specified format"""
+    """Export quiz history in specified format (streamed as it is read)"""
     try:
-        history = db.query(QuizHistory).filter(
-            QuizHistory.user_id == current_user.id
-        ).order_by(QuizHistory.completed_at.desc()).all()
+        query = db.query(QuizHistory).options(load_only(
+            QuizHistory.topic, QuizHistory.difficulty, QuizHistory.score, QuizHistory.accuracy,
+            QuizHistory.time_taken, QuizHistory.completed_at
+        )).filter(
+            and_(QuizHistory.user_id == current_user.id, QuizHistory.completed_at.isnot(None))
+        ).order_by(QuizHistory.completed_at.desc())
         
         if format == "json":
-            return {
-                "user_id": current_user.id,
-                "export_date": datetime.now().isoformat(),
-                "total_quizzes": len(history),
-                "history": [
-                    {
+            def json_chunks():
+                # Same document as before, written item by item; total_quizzes is only
+                # known once the rows have been read, so it comes last
+                buffer = io.StringIO()
+                buffer.write(f'{{"user_id": {current_user.id}, "export_date": {json.dumps(datetime.now().isoformat())}, "history": [')
+                total = 0
+                for q in query.yield_per(EXPORT_BATCH_SIZE):
+                    if total:
+                        buffer.write(", ")
+                    buffer.write(json.dumps({
                         "id": q.id,
                         "topic": q.topic,
                         "difficulty": q.difficulty,
@@ -336,32 +366,42 @@ async def export_quiz_history(
                         "accuracy": q.accuracy,
                         "time_taken": q.time_taken,
                         "completed_at": q.completed_at.isoformat()
-                    }
-                    for q in history
-                ]
-            }
-        else:  # CSV format
-            import csv
-            import io
+                    }))
+                    total += 1
+                    if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                buffer.write(f'], "total_quizzes": {total}}}')
+                yield buffer.getvalue()
             
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow(['ID', 'Topic', 'Difficulty', 'Score', 'Accuracy', 'Time Taken', 'Completed At'])
+            return StreamingResponse(json_chunks(), media_type="application/json")
+        else:  # CSV format
+            filename = f"quiz_history_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.csv"
             
-            for quiz in history:
-                writer.writerow([
-                    quiz.id,
-                    quiz.topic,
-                    quiz.difficulty,
-                    quiz.score,
-                    quiz.accuracy,
-                    quiz.time_taken,
-                    quiz.completed_at.isoformat()
-                ])
+            def csv_chunks():
+                # The CSV text is still returned as the csv_data string; each chunk is
+                # JSON-escaped on its own, which concatenates to the escaped whole
+                output = io.StringIO()
+                writer = csv.writer(output)
+                writer.writerow(['ID', 'Topic', 'Difficulty', 'Score', 'Accuracy', 'Time Taken', 'Completed At'])
+                yield '{"csv_data": "'
+                for quiz in query.yield_per(EXPORT_BATCH_SIZE):
+                    writer.writerow([
+                        quiz.id,
+                        quiz.topic,
+                        quiz.difficulty,
+                        quiz.score,
+                        quiz.accuracy,
+                        quiz.time_taken,
+                        quiz.completed_at.isoformat()
+                    ])
+                    if output.tell() >= EXPORT_CHUNK_SIZE:
+                        yield json.dumps(output.getvalue())[1:-1]
+                        output.seek(0)
+                        output.truncate()
+                yield json.dumps(output.getvalue())[1:-1] + f'", "filename": {json.dumps(filename)}}}'
             
-            return {
-                "csv_data": output.getvalue(),
-                "filename": f"quiz_history_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.csv"
-            }
+            return StreamingResponse(csv_chunks(), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to export history: {str(e)}") 
\ No newline at end of file
@@ -36,6 +36,9 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                 await chat_service.broadcast_to_room(data, message_data["room_id"])
                 
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also runs when the handler fails on a bad frame, so the socket is never left registered
         chat_service.disconnect(websocket, user_id)
 
 # WebSocket endpoint for room-specific chat
@@ -48,6 +51,8 @@ async def room_websocket_endpoint(websocket: WebSocket, room_id: int, user_id: i
             # Handle room-specific messages
             await chat_service.broadcast_to_room(data, room_id)
     except WebSocketDisconnect:
+        pass
+    finally:
         chat_service.disconnect_from_room(websocket, room_id)
 
 # Chat Room Management
@@ -90,7 +95,7 @@ async def search_rooms(
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 @router.get("/rooms/{room_id}", response_model=ChatRoomSchema)
-async def get_room(
+def get_room(
     room_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -114,7 +119,7 @@ async def get_room(
         raise HTTPException(status_code=500, detail=f"Failed to load room: {str(e)}")
 
 @router.put("/rooms/{room_id}", response_model=ChatRoomSchema)
-async def update_room(
+def update_room(
     room_id: int,
     room_data: ChatRoomUpdate,
     current_user: User = Depends(get_current_user),
@@ -173,21 +178,8 @@ async def send_message(
 ):
     """Send a message to a chat room"""
     try:
+        # Also broadcasts it to the room's WebSockets
         message = await ChatService.send_message(db, current_user.id, message_data)
-        
-        # Add user information
-        message.username = current_user.username
-        
-        # Broadcast to room via WebSocket
-        await chat_service.broadcast_to_room(
-            json.dumps({
-                "type": "message",
-                "message": message.__dict__,
-                "room_id": message.room_id
-            }),
-            message.room_id
-        )
-        
         return message
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -197,13 +189,18 @@ async def get_room_messages(
     room_id: int,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    before_created_at: Optional[datetime] = Query(None, description="created_at of the last message already loaded"),
+    before_id: Optional[int] = Query(None, description="id of the last message already loaded"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get messages from a chat room"""
+    """Get messages from a chat room, newest first; pass the last message's created_at and id to load older ones"""
+    if (before_created_at is None) != (before_id is None):
+        raise HTTPException(status_code=400, detail="before_created_at and before_id must be given together")
+    
     try:
         messages = await ChatService.get_room_messages(
-            db, room_id, limit, offset, current_user.id
+            db, room_id, limit, offset, current_user.id, before_created_at, before_id
         )
         return messages
     except Exception as e:
@@ -231,6 +228,7 @@ async def edit_message(
         
         db.commit()
         db.refresh(message)
+        await ChatService.forget_recent_messages(message.room_id)
         return message
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to edit message: {str(e)}")
@@ -254,6 +252,7 @@ async def delete_message(
         message.deleted_at = datetime.now()
         
         db.commit()
+        await ChatService.forget_recent_messages(message.room_id)
         return {"message": "Message deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete message: {str(e)}")
@@ -342,7 +341,7 @@ async def create_study_group(
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/study-groups", response_model=List[StudyGroupSchema])
-async def get_study_groups(
+def get_study_groups(
     topic: Optional[str] = None,
     difficulty: Optional[str] = None,
     limit: int = Query(20, ge=1, le=100),
@@ -362,9 +361,8 @@ async def get_study_groups(
         
         groups = query.order_by(desc(StudyGroup.created_at)).offset(offset).limit(limit).all()
         
-        # Add member count and creator info
+        # Add creator info (member_count is stored on the group)
         for group in groups:
-            group.member_count = db.query(StudyGroupMember).filter(StudyGroupMember.group_id == group.id).count()
             creator = db.query(User).filter(User.id == group.created_by).first()
             if creator:
                 group.creator_username = creator.username
@@ -127,7 +127,7 @@ async def export_analytics_summary(
         raise HTTPException(status_code=500, detail=f"Failed to generate analytics summary: {str(e)}")
 
 @router.get("/flashcards/{deck_id}")
-async def export_flashcard_deck(
+def export_flashcard_deck(
     deck_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -143,7 +143,7 @@ async def export_flashcard_deck(
         raise HTTPException(status_code=500, detail=f"Failed to export flashcard deck: {str(e)}")
 
 @router.get("/progress/timeline")
-async def export_progress_timeline(
+def export_progress_timeline(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     days: int = Query(30, ge=7, le=365)
@@ -159,7 +159,7 @@ async def export_progress_timeline(
         raise HTTPException(status_code=500, detail=f"Failed to export progress timeline: {str(e)}")
 
 @router.get("/certificate/{achievement_id}")
-async def export_achievement_certificate(
+def export_achievement_certificate(
     achievement_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
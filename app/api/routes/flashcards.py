@@ -1,19 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from anyio import from_thread
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-from sqlalchemy import and_, or_
+import csv
+import io
+from sqlalchemy import and_, or_, select, update, delete, func, distinct, type_coerce, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
 
 from app.core.database import get_db
 from app.core.auth import get_current_user
 from app.models.user import User
+from app.models.flashcards import (
+    Flashcard as FlashcardModel, FlashcardDeck as FlashcardDeckModel,
+    DeckFlashcard, FlashcardReview, StudySession, FlashcardStatus as FlashcardStatusModel
+)
 from app.services.flashcard_service import FlashcardService
 from app.schemas.flashcards import (
     FlashcardCreate, FlashcardUpdate, Flashcard, FlashcardReviewCreate,
     FlashcardDeckCreate, FlashcardDeckUpdate, FlashcardDeck,
     StudySessionCreate, StudySessionResponse, StudyProgress,
     FlashcardStats, DeckStats, FlashcardSearch, FlashcardSearchResult,
-    StudySessionUpdate
+    StudySessionUpdate, FlashcardStatus
+)
+from app.schemas.flashcards_fast import (
+    encode_json, FlashcardFast, FlashcardDeckFast, ExportedFlashcardFast, FlashcardExportFast
 )
 
 router = APIRouter()
@@ -36,42 +48,77 @@ async def create_flashcard(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Flashcards fetched per round-trip while streaming an export, and the CSV text
+# collected before each chunk is sent
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Shorter searches use an unindexed ILIKE substring match instead of full-text
+MIN_FULL_TEXT_QUERY_LENGTH = 3
+
+def _matches_text(db: Session, search_query: str):
+    """Match front or back content via the full-text index on Postgres, else by substring"""
+    if db.get_bind().dialect.name == "postgresql" and len(search_query.strip()) >= MIN_FULL_TEXT_QUERY_LENGTH:
+        # Must match the idx_flashcard_content_tsv expression (literals, not bound
+        # parameters) for the planner to use the index
+        config = literal_column("'english'")
+        content = FlashcardModel.front_content.op("||")(literal_column("' '")).op("||")(FlashcardModel.back_content)
+        return func.to_tsvector(config, content).op("@@")(func.plainto_tsquery(config, search_query))
+    
+    return or_(
+        FlashcardModel.front_content.ilike(f"%{search_query}%"),
+        FlashcardModel.back_content.ilike(f"%{search_query}%")
+    )
+
+def _has_tags(db: Session, tags: List[str]):
+    """Filter for flashcards carrying every one of tags, as a single predicate"""
+    if db.get_bind().dialect.name == "postgresql":
+        # jsonb containment, served by the GIN index on tags
+        return FlashcardModel.tags.op("@>")(type_coerce(list(tags), JSONB))
+    
+    # SQLite: count how many of the wanted tags the card's JSON array holds
+    card_tags = func.json_each(FlashcardModel.tags).table_valued("value")
+    matched = select(func.count(distinct(card_tags.c.value))).where(card_tags.c.value.in_(tags))
+    return matched.scalar_subquery() == len(set(tags))
+
 @router.get("/", response_model=List[Flashcard])
-async def get_flashcards(
+def get_flashcards(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    status: Optional[str] = None,
-    tags: Optional[List[str]] = None,
+    status: Optional[FlashcardStatus] = None,
+    tags: Optional[List[str]] = Query(None),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0)
 ):
     """Get user's flashcards with optional filtering"""
     try:
-        query = db.query(Flashcard).filter(Flashcard.user_id == current_user.id)
+        query = db.query(FlashcardModel).filter(FlashcardModel.user_id == current_user.id)
         
         if status:
-            query = query.filter(Flashcard.status == status)
+            query = query.filter(FlashcardModel.status == FlashcardStatusModel(status.value))
         
         if tags:
-            # Filter by tags (simplified - could be improved with JSON operations)
-            for tag in tags:
-                query = query.filter(Flashcard.tags.contains([tag]))
+            query = query.filter(_has_tags(db, tags))
         
         flashcards = query.offset(offset).limit(limit).all()
-        return flashcards
+        # Encoded by msgspec straight from the rows; List[Flashcard] stays the documented model
+        return Response(
+            content=encode_json([FlashcardFast.from_orm(flashcard) for flashcard in flashcards]),
+            media_type="application/json"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load flashcards: {str(e)}")
 
-@router.get("/{flashcard_id}", response_model=Flashcard)
-async def get_flashcard(
+@router.get("/{flashcard_id:int}", response_model=Flashcard)
+def get_flashcard(
     flashcard_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific flashcard"""
     try:
-        flashcard = db.query(Flashcard).filter(
-            and_(Flashcard.id == flashcard_id, Flashcard.user_id == current_user.id)
+        flashcard = db.query(FlashcardModel).filter(
+            and_(FlashcardModel.id == flashcard_id, FlashcardModel.user_id == current_user.id)
         ).first()
         
         if not flashcard:
@@ -81,8 +128,8 @@ async def get_flashcard(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load flashcard: {str(e)}")
 
-@router.put("/{flashcard_id}", response_model=Flashcard)
-async def update_flashcard(
+@router.put("/{flashcard_id:int}", response_model=Flashcard)
+def update_flashcard(
     flashcard_id: int,
     flashcard_data: FlashcardUpdate,
     current_user: User = Depends(get_current_user),
@@ -90,41 +137,59 @@ async def update_flashcard(
 ):
     """Update a flashcard"""
     try:
-        flashcard = db.query(Flashcard).filter(
-            and_(Flashcard.id == flashcard_id, Flashcard.user_id == current_user.id)
-        ).first()
+        owned = and_(FlashcardModel.id == flashcard_id, FlashcardModel.user_id == current_user.id)
+        values = flashcard_data.dict(exclude_unset=True)
+        if values:
+            # Ownership check and update in one statement
+            flashcard = db.scalars(
+                update(FlashcardModel).where(owned).values(**values).returning(FlashcardModel)
+            ).first()
+        else:
+            flashcard = db.query(FlashcardModel).filter(owned).first()
         
         if not flashcard:
             raise HTTPException(status_code=404, detail="Flashcard not found")
         
-        for field, value in flashcard_data.dict(exclude_unset=True).items():
-            setattr(flashcard, field, value)
-        
+        result = Flashcard.from_orm_fast(flashcard)
         db.commit()
-        db.refresh(flashcard)
-        return flashcard
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update flashcard: {str(e)}")
 
-@router.delete("/{flashcard_id}")
-async def delete_flashcard(
+@router.delete("/{flashcard_id:int}")
+def delete_flashcard(
     flashcard_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a flashcard"""
+    """Delete a flashcard with its reviews and deck entries"""
     try:
-        flashcard = db.query(Flashcard).filter(
-            and_(Flashcard.id == flashcard_id, Flashcard.user_id == current_user.id)
-        ).first()
+        # Every statement is limited to the caller's card, so no SELECT is needed first
+        owned = select(FlashcardModel.id).where(
+            FlashcardModel.id == flashcard_id, FlashcardModel.user_id == current_user.id
+        )
+        db.execute(
+            update(FlashcardDeckModel).where(
+                FlashcardDeckModel.id.in_(select(DeckFlashcard.deck_id).where(DeckFlashcard.flashcard_id.in_(owned)))
+            ).values(total_cards=FlashcardDeckModel.total_cards - 1)
+        )
+        db.execute(delete(DeckFlashcard).where(DeckFlashcard.flashcard_id.in_(owned)))
+        db.execute(delete(FlashcardReview).where(FlashcardReview.flashcard_id.in_(owned)))
+        deleted = db.scalar(delete(FlashcardModel).where(FlashcardModel.id.in_(owned)).returning(FlashcardModel.id))
         
-        if not flashcard:
+        if deleted is None:
+            db.rollback()
             raise HTTPException(status_code=404, detail="Flashcard not found")
         
-        db.delete(flashcard)
         db.commit()
+        # Runs in the threadpool; the cache client lives on the event loop
+        from_thread.run(FlashcardService.invalidate_stats, current_user.id)
         
         return {"message": "Flashcard deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete flashcard: {str(e)}")
 
@@ -160,27 +225,31 @@ async def create_deck(
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/decks", response_model=List[FlashcardDeck])
-async def get_decks(
+def get_decks(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user's flashcard decks"""
     try:
-        decks = db.query(FlashcardDeck).filter(FlashcardDeck.user_id == current_user.id).all()
-        return decks
+        decks = db.query(FlashcardDeckModel).filter(FlashcardDeckModel.user_id == current_user.id).all()
+        # Encoded by msgspec straight from the rows; List[FlashcardDeck] stays the documented model
+        return Response(
+            content=encode_json([FlashcardDeckFast.from_orm(deck) for deck in decks]),
+            media_type="application/json"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load decks: {str(e)}")
 
 @router.get("/decks/{deck_id}", response_model=FlashcardDeck)
-async def get_deck(
+def get_deck(
     deck_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific deck"""
     try:
-        deck = db.query(FlashcardDeck).filter(
-            and_(FlashcardDeck.id == deck_id, FlashcardDeck.user_id == current_user.id)
+        deck = db.query(FlashcardDeckModel).filter(
+            and_(FlashcardDeckModel.id == deck_id, FlashcardDeckModel.user_id == current_user.id)
         ).first()
         
         if not deck:
@@ -191,7 +260,7 @@ async def get_deck(
         raise HTTPException(status_code=500, detail=f"Failed to load deck: {str(e)}")
 
 @router.put("/decks/{deck_id}", response_model=FlashcardDeck)
-async def update_deck(
+def update_deck(
     deck_id: int,
     deck_data: FlashcardDeckUpdate,
     current_user: User = Depends(get_current_user),
@@ -199,41 +268,52 @@ async def update_deck(
 ):
     """Update a deck"""
     try:
-        deck = db.query(FlashcardDeck).filter(
-            and_(FlashcardDeck.id == deck_id, FlashcardDeck.user_id == current_user.id)
-        ).first()
+        owned = and_(FlashcardDeckModel.id == deck_id, FlashcardDeckModel.user_id == current_user.id)
+        values = deck_data.dict(exclude_unset=True)
+        if values:
+            # Ownership check and update in one statement
+            deck = db.scalars(
+                update(FlashcardDeckModel).where(owned).values(**values).returning(FlashcardDeckModel)
+            ).first()
+        else:
+            deck = db.query(FlashcardDeckModel).filter(owned).first()
         
         if not deck:
             raise HTTPException(status_code=404, detail="Deck not found")
         
-        for field, value in deck_data.dict(exclude_unset=True).items():
-            setattr(deck, field, value)
-        
+        result = FlashcardDeck.from_orm_fast(deck)
         db.commit()
-        db.refresh(deck)
-        return deck
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update deck: {str(e)}")
 
 @router.delete("/decks/{deck_id}")
-async def delete_deck(
+def delete_deck(
     deck_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a deck"""
+    """Delete a deck; its cards are kept and its study sessions are detached"""
     try:
-        deck = db.query(FlashcardDeck).filter(
-            and_(FlashcardDeck.id == deck_id, FlashcardDeck.user_id == current_user.id)
-        ).first()
+        # Every statement is limited to the caller's deck, so no SELECT is needed first
+        owned = select(FlashcardDeckModel.id).where(
+            FlashcardDeckModel.id == deck_id, FlashcardDeckModel.user_id == current_user.id
+        )
+        db.execute(delete(DeckFlashcard).where(DeckFlashcard.deck_id.in_(owned)))
+        db.execute(update(StudySession).where(StudySession.deck_id.in_(owned)).values(deck_id=None))
+        deleted = db.scalar(delete(FlashcardDeckModel).where(FlashcardDeckModel.id.in_(owned)).returning(FlashcardDeckModel.id))
         
-        if not deck:
+        if deleted is None:
+            db.rollback()
             raise HTTPException(status_code=404, detail="Deck not found")
         
-        db.delete(deck)
         db.commit()
         
         return {"message": "Deck deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete deck: {str(e)}")
 
@@ -263,7 +343,7 @@ async def start_study_session(
     """Start a new study session"""
     try:
         response = await FlashcardService.start_study_session(db, current_user.id, session_data)
-        return response
+        return Response(content=encode_json(response), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -309,70 +389,73 @@ async def get_deck_stats(
 
 # Search
 @router.post("/search", response_model=FlashcardSearchResult)
-async def search_flashcards(
+def search_flashcards(
     search_data: FlashcardSearch,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Search flashcards"""
     try:
-        query = db.query(Flashcard).filter(Flashcard.user_id == current_user.id)
+        query = db.query(FlashcardModel).filter(FlashcardModel.user_id == current_user.id)
         
         if search_data.query:
-            query = query.filter(
-                or_(
-                    Flashcard.front_content.ilike(f"%{search_data.query}%"),
-                    Flashcard.back_content.ilike(f"%{search_data.query}%")
-                )
-            )
+            query = query.filter(_matches_text(db, search_data.query))
         
         if search_data.tags:
-            for tag in search_data.tags:
-                query = query.filter(Flashcard.tags.contains([tag]))
+            query = query.filter(_has_tags(db, search_data.tags))
         
         if search_data.status:
-            query = query.filter(Flashcard.status == search_data.status)
+            query = query.filter(FlashcardModel.status == FlashcardStatusModel(search_data.status.value))
         
         if search_data.difficulty_min:
-            query = query.filter(Flashcard.difficulty_level >= search_data.difficulty_min)
+            query = query.filter(FlashcardModel.difficulty_level >= search_data.difficulty_min)
         
         if search_data.difficulty_max:
-            query = query.filter(Flashcard.difficulty_level <= search_data.difficulty_max)
+            query = query.filter(FlashcardModel.difficulty_level <= search_data.difficulty_max)
         
         if search_data.due_before:
-            query = query.filter(Flashcard.next_review <= search_data.due_before)
+            query = query.filter(FlashcardModel.next_review <= search_data.due_before)
         
-        total_count = query.count()
-        flashcards = query.offset(search_data.offset).limit(search_data.limit).all()
-        has_more = total_count > search_data.offset + search_data.limit
+        # Newest first; a cursor page starts below the previous page's last id
+        query = query.order_by(FlashcardModel.id.desc())
+        if search_data.cursor is not None:
+            query = query.filter(FlashcardModel.id < search_data.cursor)
+        elif search_data.offset:
+            query = query.offset(search_data.offset)
+        
+        # Fetch one extra row to learn whether another page exists without a COUNT(*)
+        flashcards = query.limit(search_data.limit + 1).all()
+        has_more = len(flashcards) > search_data.limit
+        flashcards = flashcards[:search_data.limit]
         
         return FlashcardSearchResult(
-            flashcards=flashcards,
-            total_count=total_count,
-            has_more=has_more
+            flashcards=[Flashcard.from_orm_fast(flashcard) for flashcard in flashcards],
+            has_more=has_more,
+            next_cursor=flashcards[-1].id if has_more else None
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 # Due Cards
 @router.get("/due", response_model=List[Flashcard])
-async def get_due_cards(
+def get_due_cards(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     limit: int = Query(20, ge=1, le=100)
 ):
-    """Get flashcards due for review"""
+    """Get flashcards due for review, most overdue first, then cards never reviewed"""
     try:
         now = datetime.now()
-        due_cards = db.query(Flashcard).filter(
+        # Read in idx_flashcard_user_next_review order, so the scan stops after limit rows
+        due_cards = db.query(FlashcardModel).filter(
             and_(
-                Flashcard.user_id == current_user.id,
+                FlashcardModel.user_id == current_user.id,
                 or_(
-                    Flashcard.next_review.is_(None),
-                    Flashcard.next_review <= now
+                    FlashcardModel.next_review.is_(None),
+                    FlashcardModel.next_review <= now
                 )
             )
-        ).limit(limit).all()
+        ).order_by(FlashcardModel.next_review.asc().nullslast()).limit(limit).all()
         
         return due_cards
     except Exception as e:
@@ -387,46 +470,56 @@ async def import_flashcards(
 ):
     """Import flashcards from external source"""
     try:
-        imported_flashcards = []
-        for flashcard_data in flashcards_data:
-            flashcard = await FlashcardService.create_flashcard_from_question(
-                db, current_user.id, flashcard_data.question_id,
-                flashcard_data.front_content, flashcard_data.back_content,
-                flashcard_data.hint, flashcard_data.tags
-            )
-            imported_flashcards.append(flashcard)
+        imported_flashcards = await FlashcardService.bulk_create_from_questions(
+            db, current_user.id, flashcards_data
+        )
         
         return {"message": f"Imported {len(imported_flashcards)} flashcards", "flashcards": imported_flashcards}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/export")
-async def export_flashcards(
+def export_flashcards(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     format: str = Query("json", regex="^(json|csv)$")
 ):
-    """Export flashcards"""
+    """Export flashcards (CSV is streamed as a file download)"""
     try:
-        flashcards = db.query(Flashcard).filter(Flashcard.user_id == current_user.id).all()
+        query = db.query(FlashcardModel).filter(FlashcardModel.user_id == current_user.id)
         
         if format == "csv":
-            # Generate CSV format
-            csv_data = "Front,Back,Hint,Tags,Status,Next Review\n"
-            for flashcard in flashcards:
-                csv_data += f'"{flashcard.front_content}","{flashcard.back_content}","{flashcard.hint or ""}","{",".join(flashcard.tags)}","{flashcard.status.value}","{flashcard.next_review or ""}"\n'
+            filename = f"flashcards_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.csv"
+            
+            def csv_rows():
+                # Rows are fetched in batches (a server-side cursor on Postgres) and
+                # written out as they arrive, so the export is never held in memory
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(["Front", "Back", "Hint", "Tags", "Status", "Next Review"])
+                for flashcard in query.yield_per(EXPORT_BATCH_SIZE):
+                    writer.writerow([
+                        flashcard.front_content, flashcard.back_content, flashcard.hint or "",
+                        ",".join(flashcard.tags or []), flashcard.status.value, flashcard.next_review or ""
+                    ])
+                    if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue()
             
-            return {
-                "format": "csv",
-                "data": csv_data,
-                "filename": f"flashcards_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.csv"
-            }
+            return StreamingResponse(
+                csv_rows(),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
         else:
-            # Return JSON format
-            return {
-                "format": "json",
-                "data": [flashcard.__dict__ for flashcard in flashcards],
-                "filename": f"flashcards_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.json"
-            }
+            # Return JSON format, encoded by msgspec straight from the rows
+            export = FlashcardExportFast(
+                format="json",
+                data=[ExportedFlashcardFast.from_orm(flashcard) for flashcard in query.yield_per(EXPORT_BATCH_SIZE)],
+                filename=f"flashcards_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.json"
+            )
+            return Response(content=encode_json(export), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}") 
\ No newline at end of file
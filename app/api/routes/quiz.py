@@ -1,9 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from anyio import from_thread
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select, update, literal, exists, func, true, Float
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List
 import json
+import time
+import asyncio
+import hashlib
 from datetime import datetime
 from app.core.database import get_db
+from app.core.cache import cache_get, cache_set, cache_add, cache_delete
 from app.core.auth import get_current_active_user
 from app.models.user import User
 from app.models.quiz import Quiz, Question, UserAnswer, QuizHistory
@@ -12,9 +20,17 @@ from app.schemas.quiz import (
     UserAnswerCreate, QuizResult, ChatMessage
 )
 from app.services.llm_service import llm_service
+from app.services.analytics_service import AnalyticsService
+from app.api.routes.user import invalidate_user_stats
 
 router = APIRouter()
 
+# Identical generate requests from one user (double submits, retries) share a single LLM
+# call: the first takes the lock, the others wait for its result
+QUIZ_GENERATION_LOCK_TTL = 60  # Seconds; longer than an LLM call is allowed to take
+QUIZ_GENERATION_RESULT_TTL = 10
+QUIZ_GENERATION_POLL_INTERVAL = 0.25
+
 @router.post("/generate", response_model=QuizResponse)
 async def generate_quiz(
     config: QuizConfig,
@@ -25,39 +41,60 @@ async def generate_quiz(
     Generate a new quiz using LLM service with history tracking.
     """
     
+    config_hash = hashlib.sha256(config.model_dump_json().encode()).hexdigest()
+    result_key = f"quiz:result:{current_user.id}:{config_hash}"
+    lock_key = f"quiz:lock:{current_user.id}:{config_hash}"
+    
     try:
-        # Check user's quiz history to avoid repetition
-        recent_quizzes = db.query(QuizHistory).filter(
-            QuizHistory.user_id == current_user.id,
-            QuizHistory.topic == config.topic
-        ).order_by(QuizHistory.created_at.desc()).limit(5).all()
-        
-        # Create context for LLM to avoid repetition
-        history_context = ""
-        if recent_quizzes:
-            history_context = f"\n\nAvoid these recent questions from user's history:\n"
-            for quiz in recent_quizzes:
-                history_context += f"- {quiz.questions_summary}\n"
-        
-        # Generate quiz using LLM service
-        questions = await llm_service.generate_quiz(config, history_context)
+        # Wait for a concurrent identical request instead of generating the quiz twice;
+        # if it fails or the lock expires, generate it here
+        deadline = time.monotonic() + QUIZ_GENERATION_LOCK_TTL
+        while True:
+            cached = await cache_get(result_key)
+            if cached is not None:
+                return QuizResponse.model_validate_json(cached)
+            locked = await cache_add(lock_key, "1", QUIZ_GENERATION_LOCK_TTL)
+            if locked or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(QUIZ_GENERATION_POLL_INTERVAL)
         
-        # Create quiz history record
-        quiz_history = QuizHistory(
-            user_id=current_user.id,
-            topic=config.topic,
-            difficulty=config.difficulty,
-            num_questions=config.num_questions,
-            time_limit=config.time_limit,
-            questions_summary=", ".join([q.question[:50] + "..." for q in questions]),
-            created_at=datetime.utcnow()
-        )
-        db.add(quiz_history)
-        db.commit()
-        
-        # Return the quiz response
-        quiz_response = QuizResponse(quiz=questions)
-        return quiz_response
+        try:
+            # Check user's quiz history to avoid repetition
+            recent_quizzes = db.query(QuizHistory).filter(
+                QuizHistory.user_id == current_user.id,
+                QuizHistory.topic == config.topic
+            ).order_by(QuizHistory.created_at.desc()).limit(5).all()
+            
+            # Create context for LLM to avoid repetition
+            history_context = ""
+            if recent_quizzes:
+                history_context = f"\n\nAvoid these recent questions from user's history:\n"
+                for quiz in recent_quizzes:
+                    history_context += f"- {quiz.questions_summary}\n"
+            
+            # Generate quiz using LLM service
+            questions = await llm_service.generate_quiz(config, history_context)
+            
+            # Create quiz history record
+            quiz_history = QuizHistory(
+                user_id=current_user.id,
+                topic=config.topic,
+                difficulty=config.difficulty,
+                num_questions=config.num_questions,
+                time_limit=config.time_limit,
+                questions_summary=", ".join([q.question[:50] + "..." for q in questions]),
+                created_at=datetime.utcnow()
+            )
+            db.add(quiz_history)
+            db.commit()
+            
+            # Return the quiz response
+            quiz_response = QuizResponse(quiz=questions)
+            await cache_set(result_key, quiz_response.model_dump_json(), QUIZ_GENERATION_RESULT_TTL)
+            return quiz_response
+        finally:
+            if locked:
+                await cache_delete(lock_key)
         
     except Exception as e:
         print(f"Quiz generation error: {e}")
@@ -69,7 +106,7 @@ async def generate_quiz(
         )
 
 @router.post("/{quiz_id}/submit-answer")
-async def submit_answer(
+def submit_answer(
     quiz_id: int,
     answer: UserAnswerCreate,
     current_user: User = Depends(get_current_active_user),
@@ -79,41 +116,43 @@ async def submit_answer(
     Submit an answer for a specific question in a quiz.
     """
     
-    # Verify quiz exists and belongs to user
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id, Quiz.user_id == current_user.id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-    
-    # Get the question
-    question = db.query(Question).filter(Question.id == answer.question_id, Question.quiz_id == quiz_id).first()
-    if not question:
-        raise HTTPException(status_code=404, detail="Question not found")
+    # One round trip: insert or update the answer, scoring it against the question, but
+    # only if the question is in this quiz and the quiz belongs to the user
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    source = select(
+        literal(current_user.id),
+        Question.quiz_id,
+        Question.id,
+        literal(answer.selected_answer),
+        Question.correct_answer == answer.selected_answer,
+        literal(answer.time_taken, Float)
+    ).join(Quiz, Quiz.id == Question.quiz_id).where(
+        Question.id == answer.question_id,
+        Question.quiz_id == quiz_id,
+        Quiz.user_id == current_user.id
+    )
+    stmt = insert(UserAnswer).from_select(
+        ['user_id', 'quiz_id', 'question_id', 'selected_answer', 'is_correct', 'time_taken'], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserAnswer.user_id, UserAnswer.quiz_id, UserAnswer.question_id],
+        set_={
+            'selected_answer': stmt.excluded.selected_answer,
+            'is_correct': stmt.excluded.is_correct,
+            'time_taken': stmt.excluded.time_taken
+        }
+    ).returning(UserAnswer.id)
     
-    # Check if answer already exists
-    existing_answer = db.query(UserAnswer).filter(
-        UserAnswer.user_id == current_user.id,
-        UserAnswer.question_id == answer.question_id,
-        UserAnswer.quiz_id == quiz_id
-    ).first()
+    answer_id = db.execute(stmt).scalar()
+    db.commit()
     
-    if existing_answer:
-        # Update existing answer
-        existing_answer.selected_answer = answer.selected_answer
-        existing_answer.is_correct = answer.selected_answer == question.correct_answer
-        existing_answer.time_taken = answer.time_taken
-    else:
-        # Create new answer
-        user_answer = UserAnswer(
-            user_id=current_user.id,
-            quiz_id=quiz_id,
-            question_id=answer.question_id,
-            selected_answer=answer.selected_answer,
-            is_correct=answer.selected_answer == question.correct_answer,
-            time_taken=answer.time_taken
-        )
-        db.add(user_answer)
+    if answer_id is None:
+        # Nothing written; only now look up which check failed
+        quiz_exists = db.query(exists().where(Quiz.id == quiz_id, Quiz.user_id == current_user.id)).scalar()
+        raise HTTPException(status_code=404, detail="Question not found" if quiz_exists else "Quiz not found")
     
-    db.commit()
+    # Runs in the threadpool; the cache client lives on the event loop
+    from_thread.run(invalidate_user_stats, current_user.id)
     
     return {"message": "Answer submitted successfully"}
 
@@ -127,50 +166,73 @@ async def complete_quiz(
     Complete a quiz and calculate results.
     """
     
-    # Get quiz and all answers
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id, Quiz.user_id == current_user.id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
+    # Get the quiz and its question and answer totals in one query; the database
+    # counts the rows instead of them being loaded here
+    question_count = select(func.count(Question.id)).where(Question.quiz_id == Quiz.id).scalar_subquery()
+    answer_totals = select(
+        func.count(UserAnswer.id).label('answered'),
+        func.count(UserAnswer.id).filter(UserAnswer.is_correct).label('correct'),
+        func.coalesce(func.sum(UserAnswer.time_taken), 0).label('time_taken')  # Seconds
+    ).where(UserAnswer.quiz_id == quiz_id, UserAnswer.user_id == current_user.id).subquery()
     
-    # Get all questions for this quiz
-    questions = db.query(Question).filter(Question.quiz_id == quiz_id).all()
+    row = db.query(
+        Quiz.topic, Quiz.difficulty, Quiz.time_limit, question_count,
+        answer_totals.c.answered, answer_totals.c.correct, answer_totals.c.time_taken
+    ).join(answer_totals, true()).filter(Quiz.id == quiz_id, Quiz.user_id == current_user.id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Quiz not found")
     
-    # Get all user answers
-    user_answers = db.query(UserAnswer).filter(
-        UserAnswer.quiz_id == quiz_id,
-        UserAnswer.user_id == current_user.id
-    ).all()
+    topic, difficulty, time_limit, total_questions, answered, correct_answers, total_time = row
     
     # Calculate results
-    total_questions = len(questions)
-    correct_answers = sum(1 for answer in user_answers if answer.is_correct)
     score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+    accuracy = (correct_answers / answered) * 100 if answered else 0
     
-    # Calculate time taken
-    total_time = sum(answer.time_taken for answer in user_answers if answer.time_taken)
+    # Update quiz completion status; the completion time comes back from the same statement
+    completed_at = db.execute(
+        update(Quiz)
+        .where(Quiz.id == quiz_id, Quiz.user_id == current_user.id)
+        .values(is_completed=True, completed_at=func.now(), score=score, accuracy=accuracy)
+        .returning(Quiz.completed_at)
+    ).scalar_one()
     
     # Create quiz result
     result = QuizResult(
         quiz_id=quiz_id,
-        user_id=current_user.id,
         total_questions=total_questions,
         correct_answers=correct_answers,
         score=score,
+        accuracy=accuracy,
         time_taken=total_time,
-        completed_at=datetime.utcnow()
+        completed_at=completed_at
     )
     
-    # Update quiz completion status
-    quiz.is_completed = True
-    quiz.completed_at = datetime.utcnow()
-    quiz.score = score
+    if total_questions == 0:
+        db.commit()
+        await invalidate_user_stats(current_user.id)
+        return result
     
-    db.commit()
+    # Analytics are committed in the same transaction as the completion
+    try:
+        await AnalyticsService.record_quiz_completion(db, current_user.id, quiz_id, {
+            'topic': topic,
+            'difficulty': difficulty,
+            'time_limit': time_limit,
+            'total_questions': total_questions,
+            'correct_answers': correct_answers,
+            'score': score,
+            'accuracy': accuracy,
+            'time_taken': total_time / 60  # Analytics track minutes
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to record quiz results: {str(e)}")
+    
+    await invalidate_user_stats(current_user.id)
     
     return result
 
 @router.get("/history", response_model=List[QuizSchema])
-async def get_quiz_history(
+def get_quiz_history(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -185,7 +247,7 @@ async def get_quiz_history(
     return quizzes
 
 @router.get("/{quiz_id}/questions")
-async def get_quiz_questions(
+def get_quiz_questions(
     quiz_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -194,17 +256,16 @@ async def get_quiz_questions(
     Get questions for a specific quiz.
     """
     
-    # Verify quiz belongs to user
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id, Quiz.user_id == current_user.id).first()
+    # Verify quiz belongs to user, loading its questions in the same query
+    quiz = db.query(Quiz).options(joinedload(Quiz.questions)).filter(
+        Quiz.id == quiz_id, Quiz.user_id == current_user.id
+    ).first()
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    # Get questions
-    questions = db.query(Question).filter(Question.quiz_id == quiz_id).all()
-    
     return {
         "quiz_id": quiz_id,
-        "questions": questions
+        "questions": quiz.questions
     }
 
 @router.post("/chat")
@@ -235,7 +296,7 @@ async def chat_with_tutor(
         )
 
 @router.get("/stats")
-async def get_quiz_stats(
+def get_quiz_stats(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
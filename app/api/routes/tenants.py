@@ -77,7 +77,7 @@ async def create_tenant(
         )
 
 @router.get("/", response_model=List[str])
-async def list_tenants(
+def list_tenants(
     db: Session = Depends(get_db)
 ):
     """
@@ -93,7 +93,7 @@ async def list_tenants(
         )
 
 @router.get("/{tenant_id}/stats", response_model=TenantStats)
-async def get_tenant_stats(
+def get_tenant_stats(
     tenant_id: str,
     db: Session = Depends(get_db)
 ):
@@ -145,7 +145,7 @@ async def delete_tenant(
         )
 
 @router.post("/{tenant_id}/users")
-async def create_tenant_user(
+def create_tenant_user(
     tenant_id: str,
     user_data: dict,
     db: Session = Depends(get_db)
@@ -188,7 +188,7 @@ async def create_tenant_user(
         )
 
 @router.get("/{tenant_id}/users")
-async def list_tenant_users(
+def list_tenant_users(
     tenant_id: str,
     db: Session = Depends(get_db)
 ):
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from anyio import from_thread
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 from typing import List
+import json
 from app.core.database import get_db
+from app.core.cache import cache_get, cache_set, cache_delete
 from app.core.auth import get_current_active_user
 from app.models.user import User
 from app.models.quiz import Quiz, UserAnswer
@@ -9,6 +14,35 @@ from app.schemas.user import User as UserSchema
 
 router = APIRouter()
 
+# Stats and recent activity are read on every dashboard render; answering or completing
+# a quiz invalidates them (see invalidate_user_stats)
+USER_STATS_CACHE_TTL = 60
+
+# Both tables are aggregated in the database and only the totals come back. Written as
+# text: the statement is fixed, and building it as an expression on every request cost
+# several times the query itself
+USER_STATS_QUERY = text(
+    "SELECT quiz_totals.total_quizzes, quiz_totals.total_questions, quiz_totals.average_score, "
+    "answer_totals.total_answers, answer_totals.correct_answers "
+    "FROM (SELECT COUNT(*) AS total_quizzes, COALESCE(SUM(num_questions), 0) AS total_questions, "
+    "COALESCE(AVG(score), 0) AS average_score "
+    "FROM quizzes WHERE user_id = :user_id AND completed_at IS NOT NULL) AS quiz_totals "
+    "CROSS JOIN (SELECT COUNT(*) AS total_answers, "
+    "COUNT(*) FILTER (WHERE is_correct) AS correct_answers "
+    "FROM user_answers WHERE user_id = :user_id) AS answer_totals"
+)
+
+def _stats_key(user_id: int) -> str:
+    return f"user:{user_id}:stats"
+
+def _recent_activity_key(user_id: int) -> str:
+    return f"user:{user_id}:recent-activity"
+
+async def invalidate_user_stats(user_id: int):
+    """Drop the user's cached stats and recent activity"""
+    await cache_delete(_stats_key(user_id))
+    await cache_delete(_recent_activity_key(user_id))
+
 @router.get("/profile", response_model=UserSchema)
 async def get_user_profile(current_user: User = Depends(get_current_active_user)):
     """
@@ -17,36 +51,26 @@ async def get_user_profile(current_user: User = Depends(get_current_active_user)
     return current_user
 
 @router.get("/stats")
-async def get_user_stats(
+def get_user_stats(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Get user's quiz statistics.
     """
-    # Get completed quizzes
-    completed_quizzes = db.query(Quiz).filter(
-        Quiz.user_id == current_user.id,
-        Quiz.completed_at.isnot(None)
-    ).all()
+    # Runs in the threadpool; the cache client lives on the event loop. Cached entries
+    # are the encoded response, sent as is
+    cached = from_thread.run(cache_get, _stats_key(current_user.id))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
     
-    # Calculate statistics
-    total_quizzes = len(completed_quizzes)
-    total_questions = sum(quiz.num_questions for quiz in completed_quizzes)
+    total_quizzes, total_questions, avg_score, total_answers, correct_answers = db.execute(
+        USER_STATS_QUERY, {"user_id": current_user.id}
+    ).one()
     
-    # Get all user answers
-    user_answers = db.query(UserAnswer).filter(
-        UserAnswer.user_id == current_user.id
-    ).all()
-    
-    correct_answers = sum(1 for answer in user_answers if answer.is_correct)
-    total_answers = len(user_answers)
     overall_accuracy = (correct_answers / total_answers * 100) if total_answers > 0 else 0
     
-    # Average score
-    avg_score = sum(quiz.score for quiz in completed_quizzes) / total_quizzes if total_quizzes > 0 else 0
-    
-    return {
+    stats = {
         "total_quizzes": total_quizzes,
         "total_questions": total_questions,
         "total_answers": total_answers,
@@ -54,17 +78,28 @@ async def get_user_stats(
         "overall_accuracy": round(overall_accuracy, 2),
         "average_score": round(avg_score, 2)
     }
+    content = json.dumps(stats)
+    from_thread.run(cache_set, _stats_key(current_user.id), content, USER_STATS_CACHE_TTL)
+    
+    return Response(content=content, media_type="application/json")
 
 @router.get("/recent-activity")
-async def get_recent_activity(
+def get_recent_activity(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Get user's recent quiz activity.
     """
+    cached = from_thread.run(cache_get, _recent_activity_key(current_user.id))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
     recent_quizzes = db.query(Quiz).filter(
         Quiz.user_id == current_user.id
     ).order_by(Quiz.created_at.desc()).limit(5).all()
     
-    return recent_quizzes 
\ No newline at end of file
+    content = json.dumps(jsonable_encoder(recent_quizzes))
+    from_thread.run(cache_set, _recent_activity_key(current_user.id), content, USER_STATS_CACHE_TTL)
+    
+    return Response(content=content, media_type="application/json") 
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Small string cache for computed responses.
+
+Uses Redis (settings.redis_url) when it is installed and reachable, so every
+worker shares entries and invalidations. The same client is shared with other
+Redis users such as the chat pub/sub fan-out. Otherwise falls back to a bounded
+in-process TTL dict, which suits single-process deployments. After a Redis error
+the fallback is used for REDIS_RETRY_INTERVAL seconds, then Redis is tried again.
+"""
+
+import time
+from typing import Dict, Optional, Set, Tuple
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    RedisError = ConnectionError  # Keeps callers' except clauses valid without redis
+
+# In-process fallback: key -> (expires_at, value)
+LOCAL_CACHE_MAXSIZE = 10_000
+LOCAL_CACHE_MAX_TTL = 60
+_local_cache: Dict[str, Tuple[float, str]] = {}
+
+# Seconds to stay on the in-process fallback after a Redis error before retrying
+REDIS_RETRY_INTERVAL = 30
+
+# Keys deleted while Redis was unusable; deleted there too once it is back
+PENDING_DELETES_MAXSIZE = 10_000
+_pending_deletes: Set[str] = set()
+
+_redis = None
+_redis_failed_at: Optional[float] = None
+
+def get_redis():
+    """Return the shared Redis client, or None while backing off after an error"""
+    global _redis, _redis_failed_at
+    if not REDIS_AVAILABLE:
+        return None
+    if _redis_failed_at is not None:
+        if time.monotonic() - _redis_failed_at < REDIS_RETRY_INTERVAL:
+            return None
+        _redis_failed_at = None
+    if _redis is None:
+        _redis = aioredis.from_url(
+            settings.redis_url,
+            decode_responses=True,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5
+        )
+    return _redis
+
+def disable_redis(error: Exception):
+    """Back off from Redis for REDIS_RETRY_INTERVAL seconds after an error"""
+    global _redis_failed_at
+    _redis_failed_at = time.monotonic()
+    print(f"Warning: Redis cache unavailable, using in-process cache for {REDIS_RETRY_INTERVAL}s: {error}")
+
+async def _flush_pending_deletes(client):
+    """Apply invalidations that happened while Redis was unusable"""
+    if _pending_deletes:
+        keys = list(_pending_deletes)
+        await client.delete(*keys)
+        _pending_deletes.difference_update(keys)
+
+def _remember_delete(key: str):
+    if len(_pending_deletes) < PENDING_DELETES_MAXSIZE:
+        _pending_deletes.add(key)
+
+async def cache_get(key: str) -> Optional[str]:
+    """Get a cached value, or None if missing or expired"""
+    client = get_redis()
+    if client is not None:
+        try:
+            await _flush_pending_deletes(client)
+            return await client.get(key)
+        except RedisError as e:
+            disable_redis(e)
+
+    entry = _local_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        _local_cache.pop(key, None)
+        return None
+    return value
+
+async def cache_set(key: str, value: str, ttl: int):
+    """Cache a value for ttl seconds"""
+    client = get_redis()
+    if client is not None:
+        try:
+            await _flush_pending_deletes(client)
+            await client.set(key, value, ex=ttl)
+            return
+        except RedisError as e:
+            disable_redis(e)
+
+    _local_set(key, value, ttl)
+
+async def cache_add(key: str, value: str, ttl: int) -> bool:
+    """Cache a value only if the key is not already set; True if this call set it"""
+    client = get_redis()
+    if client is not None:
+        try:
+            await _flush_pending_deletes(client)
+            return bool(await client.set(key, value, ex=ttl, nx=True))
+        except RedisError as e:
+            disable_redis(e)
+
+    if await cache_get(key) is not None:
+        return False
+    _local_set(key, value, ttl)
+    return True
+
+def _local_set(key: str, value: str, ttl: int):
+    # Other workers cannot see local invalidations, so keep local entries short-lived
+    if len(_local_cache) >= LOCAL_CACHE_MAXSIZE:
+        now = time.monotonic()
+        for stale_key in [k for k, (expires_at, _) in _local_cache.items() if expires_at < now]:
+            del _local_cache[stale_key]
+        if len(_local_cache) >= LOCAL_CACHE_MAXSIZE:
+            # Still full: drop the oldest entry
+            del _local_cache[next(iter(_local_cache))]
+    _local_cache[key] = (time.monotonic() + min(ttl, LOCAL_CACHE_MAX_TTL), value)
+
+async def cache_delete(key: str):
+    """Invalidate a cached value"""
+    _local_cache.pop(key, None)
+    client = get_redis()
+    if client is not None:
+        try:
+            await _flush_pending_deletes(client)
+            await client.delete(key)
+            return
+        except RedisError as e:
+            disable_redis(e)
+    
+    # Redis may still hold the value; drop it there once Redis is reachable again
+    if REDIS_AVAILABLE:
+        _remember_delete(key)
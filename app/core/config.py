@@ -11,6 +11,12 @@ class Settings(BaseSettings):
     def database_url_property(self):
         return os.getenv("DATABASE_URL", self.database_url)
     
+    # Postgres connection pool. Each threadpool request holds a connection while it
+    # runs, so pool size plus overflow should cover the threadpool's 40 workers.
+    db_pool_size: int = 20
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 10  # Seconds to wait for a free connection before failing
+    
     # Redis
     redis_url: str = "redis://localhost:6379"
     
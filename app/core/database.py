@@ -20,6 +20,9 @@ if USE_NEON:
     
     engine = create_engine(
         DATABASE_URL,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
         pool_pre_ping=True,
         pool_recycle=300,
         echo=False
@@ -1,7 +1,7 @@
 # Import all models to ensure they are registered with SQLAlchemy
 from .user import User
 from .quiz import Quiz, Question, UserAnswer, QuizHistory
-from .analytics import UserProgress, TopicAnalytics, DifficultyAnalytics, QuestionAnalytics, LearningPath
+from .analytics import UserProgress, TopicAnalytics, DifficultyAnalytics, QuestionAnalytics, LearningPath, UserDashboardCache
 from .chat import ChatRoom, ChatParticipant, ChatMessage, StudyGroup, StudyGroupMember, ChatNotification
 from .flashcards import Flashcard, FlashcardReview, FlashcardDeck, DeckFlashcard, StudySession
 
@@ -15,7 +15,7 @@ __all__ = [
     
     # Analytics models
     "UserProgress", "TopicAnalytics", 
-    "DifficultyAnalytics", "QuestionAnalytics", "LearningPath",
+    "DifficultyAnalytics", "QuestionAnalytics", "LearningPath", "UserDashboardCache",
     
     # Chat models
     "ChatRoom", "ChatParticipant", "ChatMessage", 
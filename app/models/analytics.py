@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Float, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Float, Boolean, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.mutable import MutableList
 from app.core.database import Base
+from app.models.quiz import QuizHistory  # Shared with quiz generation; re-exported for analytics code
 import enum
 
 class DifficultyLevel(enum.Enum):
@@ -40,7 +42,7 @@ class UserProgress(Base):
     last_quiz_date = Column(DateTime(timezone=True), nullable=True)
     
     # Learning Progress
-    topics_covered = Column(JSON, default=list)  # List of topics
+    topics_covered = Column(MutableList.as_mutable(JSON), default=list)  # List of topics
     difficulty_progress = Column(JSON, default=dict)  # {"Easy": 0.8, "Medium": 0.6, "Hard": 0.4}
     
     # Timestamps
@@ -61,7 +63,7 @@ class TopicAnalytics(Base):
     
     # Topic Information
     topic = Column(String, nullable=False)
-    category = Column(Enum(TopicCategory), nullable=False)
+    category = Column(Enum(TopicCategory, native_enum=False, length=20), nullable=False)
     
     # Performance Metrics
     quizzes_taken = Column(Integer, default=0)
@@ -88,6 +90,11 @@ class TopicAnalytics(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # One row per user and topic, looked up on every quiz completion
+    __table_args__ = (
+        Index('idx_topic_analytics_user_topic', 'user_id', 'topic', unique=True),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="topic_analytics")
     user_progress = relationship("UserProgress", back_populates="topic_analytics")
@@ -100,7 +107,7 @@ class DifficultyAnalytics(Base):
     user_progress_id = Column(Integer, ForeignKey("user_progress.id"), nullable=False)
     
     # Difficulty Level
-    difficulty = Column(Enum(DifficultyLevel), nullable=False)
+    difficulty = Column(Enum(DifficultyLevel, native_enum=False, length=10), nullable=False)
     
     # Performance Metrics
     quizzes_taken = Column(Integer, default=0)
@@ -119,13 +126,18 @@ class DifficultyAnalytics(Base):
     slowest_completion = Column(Float, default=0.0)  # in minutes
     
     # Progress Tracking
-    improvement_trend = Column(JSON, default=list)  # List of scores over time
+    improvement_trend = Column(MutableList.as_mutable(JSON), default=list)  # Last IMPROVEMENT_TREND_LIMIT scores
     readiness_score = Column(Float, default=0.0)  # How ready user is for next difficulty
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # One row per user and difficulty, looked up on every quiz completion
+    __table_args__ = (
+        Index('idx_difficulty_analytics_user_difficulty', 'user_id', 'difficulty', unique=True),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="difficulty_analytics")
     user_progress = relationship("UserProgress", back_populates="difficulty_analytics")
@@ -172,7 +184,7 @@ class LearningPath(Base):
     # Path Information
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    category = Column(Enum(TopicCategory), nullable=False)
+    category = Column(Enum(TopicCategory, native_enum=False, length=20), nullable=False)
     
     # Progress Tracking
     current_level = Column(Integer, default=1)
@@ -195,4 +207,12 @@ class LearningPath(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
-    user = relationship("User", back_populates="learning_paths") 
\ No newline at end of file
+    user = relationship("User", back_populates="learning_paths") 
+
+class UserDashboardCache(Base):
+    """Pre-computed analytics dashboard per user, rewritten on every quiz completion and when found stale"""
+    __tablename__ = "user_dashboard_cache"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    summary_json = Column(JSON, nullable=False)  # Serialized AnalyticsDashboard
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Boolean, Enum, Index, DDL, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -28,6 +28,7 @@ class ChatRoom(Base):
     topic = Column(String, nullable=True)  # For topic-based rooms
     is_active = Column(Boolean, default=True)
     max_participants = Column(Integer, default=100)
+    active_participant_count = Column(Integer, default=0)  # Kept in step by join_room/leave_room
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -48,6 +49,12 @@ class ChatParticipant(Base):
     last_read_at = Column(DateTime(timezone=True), nullable=True)
     is_active = Column(Boolean, default=True)
     
+    # Membership checks filter by user and room; room listings count active participants
+    __table_args__ = (
+        Index('idx_chat_participant_user_room', 'user_id', 'room_id'),
+        Index('idx_chat_participant_room_active', 'room_id', 'is_active'),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="chat_participations")
     room = relationship("ChatRoom", back_populates="participants")
@@ -69,12 +76,43 @@ class ChatMessage(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Room history is read newest first, skipping deleted messages
+    __table_args__ = (
+        Index('idx_chat_message_room_deleted_created', room_id, is_deleted, created_at.desc()),
+    )
+    
     # Relationships
     room = relationship("ChatRoom", back_populates="messages")
     user = relationship("User", back_populates="chat_messages")
     reply_to = relationship("ChatMessage", remote_side=[id])
     replies = relationship("ChatMessage", back_populates="reply_to")
 
+# Message search index (Postgres only): full-text over to_tsvector('simple', content).
+# Searches too short for full-text use ILIKE, which no index can serve at that length.
+MESSAGE_SEARCH_INDEX_DDL = DDL(
+    "CREATE INDEX IF NOT EXISTS idx_chat_message_content_tsv "
+    "ON %(fullname)s USING gin (to_tsvector('simple', content))"
+).execute_if(dialect="postgresql")
+event.listen(ChatMessage.__table__, "after_create", MESSAGE_SEARCH_INDEX_DDL)
+
+# Popular topics for the chat stats (Postgres only), refreshed in the background by
+# ChatService instead of grouping every message on each stats request. The unique
+# index lets REFRESH ... CONCURRENTLY run without blocking readers.
+POPULAR_TOPICS_VIEW_DDL = DDL(
+    "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_popular_topics AS "
+    "SELECT r.topic, COUNT(m.id) AS message_count "
+    "FROM chat_rooms r JOIN %(fullname)s m ON m.room_id = r.id "
+    "WHERE r.topic IS NOT NULL AND m.is_deleted = false "
+    "GROUP BY r.topic; "
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_popular_topics_topic ON mv_popular_topics (topic)"
+).execute_if(dialect="postgresql")
+event.listen(ChatMessage.__table__, "after_create", POPULAR_TOPICS_VIEW_DDL)
+event.listen(
+    ChatMessage.__table__,
+    "before_drop",
+    DDL("DROP MATERIALIZED VIEW IF EXISTS mv_popular_topics").execute_if(dialect="postgresql")
+)
+
 # Temporarily disabled to fix database relationship issues
 # class TopicSuggestion(Base):
 #     __tablename__ = "topic_suggestions"
@@ -105,6 +143,7 @@ class StudyGroup(Base):
     topic = Column(String, nullable=False)
     difficulty = Column(String, nullable=False)
     max_members = Column(Integer, default=20)
+    member_count = Column(Integer, default=0)  # Kept in step by join_study_group
     is_public = Column(Boolean, default=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Float, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Float, Boolean, Enum, Index, DDL, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -21,12 +22,13 @@ class Flashcard(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=True, index=True)  # Source quiz question
     
     # Flashcard Content
     front_content = Column(Text, nullable=False)  # Question or concept
     back_content = Column(Text, nullable=False)   # Answer or explanation
     hint = Column(Text, nullable=True)            # Optional hint
-    tags = Column(JSON, default=list)             # Categories/tags
+    tags = Column(JSON().with_variant(JSONB(), "postgresql"), default=list)  # Categories/tags
     topic = Column(String, nullable=False)        # Topic for categorization
     
     # Learning Algorithm Data
@@ -47,6 +49,25 @@ class Flashcard(Base):
     # Relationships
     user = relationship("User", back_populates="flashcards")
     review_history = relationship("FlashcardReview", back_populates="flashcard")
+    
+    __table_args__ = (
+        Index('idx_flashcard_user_id', 'user_id', 'id'),
+        Index('idx_flashcard_user_next_review', 'user_id', 'next_review'),
+    )
+
+# Tag filter index (Postgres only): one GIN probe answers "has all of these tags" (@>)
+FLASHCARD_TAGS_INDEX_DDL = DDL(
+    "CREATE INDEX IF NOT EXISTS idx_flashcard_tags_gin "
+    "ON %(fullname)s USING gin (tags jsonb_path_ops)"
+).execute_if(dialect="postgresql")
+event.listen(Flashcard.__table__, "after_create", FLASHCARD_TAGS_INDEX_DDL)
+
+# Flashcard search index (Postgres only): English full-text over front and back together
+FLASHCARD_SEARCH_INDEX_DDL = DDL(
+    "CREATE INDEX IF NOT EXISTS idx_flashcard_content_tsv "
+    "ON %(fullname)s USING gin (to_tsvector('english', front_content || ' ' || back_content))"
+).execute_if(dialect="postgresql")
+event.listen(Flashcard.__table__, "after_create", FLASHCARD_SEARCH_INDEX_DDL)
 
 class FlashcardReview(Base):
     __tablename__ = "flashcard_reviews"
@@ -72,6 +93,11 @@ class FlashcardReview(Base):
     flashcard = relationship("Flashcard", back_populates="review_history")
     user = relationship("User", back_populates="flashcard_reviews")
 
+    # The flashcard stats total a user's reviews from this index alone
+    __table_args__ = (
+        Index('idx_flashcard_review_user', 'user_id', 'was_correct', 'response_time'),
+    )
+
 class FlashcardDeck(Base):
     __tablename__ = "flashcard_decks"
     
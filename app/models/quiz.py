@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Float, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB
 from app.core.database import Base
 
 class Quiz(Base):
@@ -22,6 +23,12 @@ class Quiz(Base):
     user = relationship("User", back_populates="quizzes")
     questions = relationship("Question", back_populates="quiz")
     user_answers = relationship("UserAnswer", back_populates="quiz")
+    
+    # Quizzes are read per user: completed ones for stats, newest first for recent activity
+    __table_args__ = (
+        Index('idx_quiz_user_completed', user_id, completed_at),
+        Index('idx_quiz_user_created', user_id, created_at.desc()),
+    )
 
 class Question(Base):
     __tablename__ = "questions"
@@ -37,6 +44,7 @@ class Question(Base):
     # Relationships
     quiz = relationship("Quiz", back_populates="questions")
     user_answers = relationship("UserAnswer", back_populates="question")
+    analytics = relationship("QuestionAnalytics", back_populates="question")
 
 class UserAnswer(Base):
     __tablename__ = "user_answers"
@@ -54,6 +62,13 @@ class UserAnswer(Base):
     user = relationship("User", back_populates="user_answers")
     quiz = relationship("Quiz", back_populates="user_answers")
     question = relationship("Question", back_populates="user_answers")
+    
+    # One answer per question; submit_answer upserts on it. The user stats count
+    # correct answers from the second index alone
+    __table_args__ = (
+        Index('idx_user_answer_user_quiz_question', user_id, quiz_id, question_id, unique=True),
+        Index('idx_user_answer_user_correct', user_id, is_correct),
+    )
 
 class QuizHistory(Base):
     __tablename__ = "quiz_history"
@@ -67,5 +82,32 @@ class QuizHistory(Base):
     questions_summary = Column(Text, nullable=True)  # Summary of questions for repetition avoidance
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Results, filled in by AnalyticsService.create_quiz_history when a quiz is completed.
+    # Rows written at generation time leave them NULL (completed_at IS NULL).
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=True)
+    score = Column(Float, nullable=True)
+    accuracy = Column(Float, nullable=True)
+    correct_answers = Column(Integer, nullable=True)
+    total_questions = Column(Integer, nullable=True)
+    time_taken = Column(Float, nullable=True)  # in minutes
+    question_breakdown = Column(JSON, nullable=True)  # Detailed analysis of each question
+    weak_areas_identified = Column(JSON().with_variant(JSONB(), "postgresql"), default=list)  # Areas that need improvement
+    strengths_identified = Column(JSON, default=list)  # Areas of strength
+    average_time_per_question = Column(Float, nullable=True)  # in seconds
+    questions_answered_quickly = Column(Integer, default=0)  # Questions answered in <30 seconds
+    questions_answered_slowly = Column(Integer, default=0)  # Questions answered in >2 minutes
+    difficulty_level = Column(String, nullable=True)  # Easy, Medium, Hard
+    next_recommended_difficulty = Column(String, nullable=True)
+    concepts_mastered = Column(JSON, default=list)
+    concepts_to_review = Column(JSON, default=list)
+    recommended_next_topics = Column(JSON, default=list)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # History is always read per user, newest first, optionally narrowed to a topic
+    __table_args__ = (
+        Index('idx_quiz_history_user_created', user_id, created_at.desc()),
+        Index('idx_quiz_history_user_topic_created', user_id, topic, created_at.desc()),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="quiz_history") 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -39,8 +39,7 @@ class UserProgress(UserProgressBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Topic Analytics Schemas
 class TopicAnalyticsBase(BaseModel):
@@ -67,8 +66,7 @@ class TopicAnalytics(TopicAnalyticsBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Difficulty Analytics Schemas
 class DifficultyAnalyticsBase(BaseModel):
@@ -83,7 +81,7 @@ class DifficultyAnalyticsBase(BaseModel):
     average_time_per_question: float = 0.0
     fastest_completion: float = 0.0
     slowest_completion: float = 0.0
-    improvement_trend: List[float] = []
+    improvement_trend: List[Dict[str, Any]] = []  # {date, score, accuracy, time_taken} per attempt
     readiness_score: float = 0.0
 
 class DifficultyAnalytics(DifficultyAnalyticsBase):
@@ -93,15 +91,14 @@ class DifficultyAnalytics(DifficultyAnalyticsBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Quiz History Schemas
 class QuestionBreakdown(BaseModel):
     question_id: int
     question_text: str
-    user_answer: str
-    correct_answer: str
+    user_answer: int  # Option index, as stored on UserAnswer
+    correct_answer: int
     is_correct: bool
     time_taken: float
     difficulty_perceived: Optional[float] = None
@@ -134,8 +131,7 @@ class QuizHistory(QuizHistoryBase):
     quiz_id: int
     completed_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Question Analytics Schemas
 class QuestionAnalyticsBase(BaseModel):
@@ -157,8 +153,7 @@ class QuestionAnalytics(QuestionAnalyticsBase):
     first_attempted_at: datetime
     last_attempted_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Learning Path Schemas
 class LearningPathBase(BaseModel):
@@ -182,8 +177,7 @@ class LearningPath(LearningPathBase):
     started_at: datetime
     completed_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Analytics Summary Schemas
 class AnalyticsSummary(BaseModel):
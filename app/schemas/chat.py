@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -41,8 +41,7 @@ class ChatRoom(ChatRoomBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Chat Participant Schemas
 class ChatParticipantBase(BaseModel):
@@ -56,8 +55,7 @@ class ChatParticipant(ChatParticipantBase):
     last_read_at: Optional[datetime] = None
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Chat Message Schemas
 class ChatMessageBase(BaseModel):
@@ -83,8 +81,7 @@ class ChatMessage(ChatMessageBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Topic Suggestion Schemas
 class TopicSuggestionBase(BaseModel):
@@ -111,8 +108,7 @@ class TopicSuggestion(TopicSuggestionBase):
     approved_at: Optional[datetime] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Study Group Schemas
 class StudyGroupBase(BaseModel):
@@ -132,8 +128,7 @@ class StudyGroup(StudyGroupBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Study Group Member Schemas
 class StudyGroupMemberBase(BaseModel):
@@ -146,8 +141,7 @@ class StudyGroupMember(StudyGroupMemberBase):
     joined_at: datetime
     last_active: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Chat Notification Schemas
 class ChatNotificationBase(BaseModel):
@@ -162,8 +156,7 @@ class ChatNotification(ChatNotificationBase):
     is_read: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Search and List Schemas
 class ChatSearch(BaseModel):
@@ -177,8 +170,19 @@ class MessageSearch(BaseModel):
     query: Optional[str] = None
     message_type: Optional[MessageType] = None
     user_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
     limit: int = Field(default=50, ge=1, le=100)
     offset: int = Field(default=0, ge=0)
+    # Keyset cursor: created_at and id of the last message of the previous page
+    before_created_at: Optional[datetime] = None
+    before_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_cursor(self):
+        if (self.before_created_at is None) != (self.before_id is None):
+            raise ValueError("before_created_at and before_id must be given together")
+        return self
 
 class ChatRoomList(BaseModel):
     rooms: List[ChatRoom]
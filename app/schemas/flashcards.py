@@ -1,7 +1,56 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator, model_validator
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from enum import Enum
+import sys
+
+# Inclusive numeric bounds, checked in one validator per model
+DECK_LIMIT_BOUNDS: Dict[str, Tuple[int, int]] = {
+    "daily_limit": (1, 100),
+    "new_cards_per_day": (1, 50),
+    "review_cards_per_day": (1, 200),
+}
+
+SPACED_REPETITION_BOUNDS: Dict[str, Tuple[float, float]] = {
+    "initial_ease_factor": (1.3, 5.0),
+    "minimum_ease_factor": (1.0, 2.0),
+    "ease_bonus": (0.0, 1.0),
+    "interval_modifier": (0.1, 10.0),
+    "maximum_interval": (1, 36500),  # 100 years max
+}
+
+def _check_bounds(model: BaseModel, bounds: Dict[str, Tuple[float, float]]) -> BaseModel:
+    """Validate all numeric bounds of a model in a single pass"""
+    for field, (low, high) in bounds.items():
+        value = getattr(model, field)
+        if value is not None and not low <= value <= high:
+            raise ValueError(f"{field} must be between {low} and {high}")
+    return model
+
+def _construct_from_orm(model_cls, row, **overrides):
+    """Build a schema from a trusted ORM row without running validators"""
+    # model_construct would silently leave a required field out, so insist the row has them all
+    missing = [
+        name for name, field in model_cls.model_fields.items()
+        if field.is_required() and name not in overrides and not hasattr(row, name)
+    ]
+    if missing:
+        raise ValueError(f"{type(row).__name__} row has no value for required {model_cls.__name__} fields: {missing}")
+    
+    # Optional columns the row does not carry fall back to the schema defaults
+    values = {
+        name: getattr(row, name)
+        for name in model_cls.model_fields
+        if name not in overrides and hasattr(row, name)
+    }
+    values.update(overrides)
+    return model_cls.model_construct(**values)
+
+def _intern_tags(tags: Optional[Tuple[str, ...]]) -> Optional[Tuple[str, ...]]:
+    """Share one string object per distinct tag across all flashcards"""
+    if tags is None:
+        return None
+    return tuple(sys.intern(tag) for tag in tags)
 
 class FlashcardStatus(str, Enum):
     NEW = "new"
@@ -20,7 +69,12 @@ class FlashcardBase(BaseModel):
     front_content: str = Field(..., description="Question or concept")
     back_content: str = Field(..., description="Answer or explanation")
     hint: Optional[str] = Field(None, description="Optional hint")
-    tags: List[str] = Field(default_factory=list, description="Categories/tags")
+    tags: Tuple[str, ...] = Field(default_factory=tuple, description="Categories/tags")
+    
+    @field_validator("tags")
+    @classmethod
+    def intern_tags(cls, v):
+        return _intern_tags(v)
 
 class FlashcardCreate(FlashcardBase):
     question_id: int = Field(..., description="ID of the original question")
@@ -29,12 +83,17 @@ class FlashcardUpdate(BaseModel):
     front_content: Optional[str] = None
     back_content: Optional[str] = None
     hint: Optional[str] = None
-    tags: Optional[List[str]] = None
+    tags: Optional[Tuple[str, ...]] = None
+    
+    @field_validator("tags")
+    @classmethod
+    def intern_tags(cls, v):
+        return _intern_tags(v)
 
 class Flashcard(FlashcardBase):
     id: int
     user_id: int
-    question_id: int
+    question_id: Optional[int] = None  # NULL on cards created before it was stored
     status: FlashcardStatus
     difficulty_level: float
     interval: int
@@ -47,8 +106,16 @@ class Flashcard(FlashcardBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @classmethod
+    def from_orm_fast(cls, row) -> "Flashcard":
+        """Skip validation for rows read back from the database"""
+        return _construct_from_orm(
+            cls, row,
+            status=FlashcardStatus(row.status.value),
+            tags=_intern_tags(tuple(row.tags or ()))
+        )
 
 # Flashcard Review Schemas
 class FlashcardReviewBase(BaseModel):
@@ -69,8 +136,15 @@ class FlashcardReview(FlashcardReviewBase):
     review_session_id: Optional[str] = None
     reviewed_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @classmethod
+    def from_orm_fast(cls, row) -> "FlashcardReview":
+        """Skip validation for rows read back from the database"""
+        return _construct_from_orm(
+            cls, row,
+            difficulty_rating=FlashcardDifficulty(row.difficulty_rating.value)
+        )
 
 # Flashcard Deck Schemas
 class FlashcardDeckBase(BaseModel):
@@ -78,9 +152,13 @@ class FlashcardDeckBase(BaseModel):
     description: Optional[str] = Field(None, description="Deck description")
     topic: str = Field(..., description="Topic of the deck")
     difficulty: str = Field(..., description="Difficulty level")
-    daily_limit: int = Field(default=20, ge=1, le=100, description="Cards per day")
-    new_cards_per_day: int = Field(default=10, ge=1, le=50, description="New cards per day")
-    review_cards_per_day: int = Field(default=50, ge=1, le=200, description="Review cards per day")
+    daily_limit: int = Field(default=20, description="Cards per day")
+    new_cards_per_day: int = Field(default=10, description="New cards per day")
+    review_cards_per_day: int = Field(default=50, description="Review cards per day")
+    
+    @model_validator(mode="after")
+    def check_limits(self):
+        return _check_bounds(self, DECK_LIMIT_BOUNDS)
 
 class FlashcardDeckCreate(FlashcardDeckBase):
     pass
@@ -90,9 +168,13 @@ class FlashcardDeckUpdate(BaseModel):
     description: Optional[str] = None
     topic: Optional[str] = None
     difficulty: Optional[str] = None
-    daily_limit: Optional[int] = Field(None, ge=1, le=100)
-    new_cards_per_day: Optional[int] = Field(None, ge=1, le=50)
-    review_cards_per_day: Optional[int] = Field(None, ge=1, le=200)
+    daily_limit: Optional[int] = None
+    new_cards_per_day: Optional[int] = None
+    review_cards_per_day: Optional[int] = None
+    
+    @model_validator(mode="after")
+    def check_limits(self):
+        return _check_bounds(self, DECK_LIMIT_BOUNDS)
 
 class FlashcardDeck(FlashcardDeckBase):
     id: int
@@ -105,8 +187,12 @@ class FlashcardDeck(FlashcardDeckBase):
     updated_at: Optional[datetime] = None
     last_studied: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @classmethod
+    def from_orm_fast(cls, row) -> "FlashcardDeck":
+        """Skip validation for rows read back from the database"""
+        return _construct_from_orm(cls, row)
 
 # Study Session Schemas
 class StudySessionBase(BaseModel):
@@ -128,8 +214,12 @@ class StudySession(StudySessionBase):
     accuracy: float
     average_response_time: float
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @classmethod
+    def from_orm_fast(cls, row) -> "StudySession":
+        """Skip validation for rows read back from the database"""
+        return _construct_from_orm(cls, row)
 
 # Study Session Update
 class StudySessionUpdate(BaseModel):
@@ -152,7 +242,7 @@ class StudyCard(BaseModel):
 
 class StudySessionResponse(BaseModel):
     session_id: str
-    cards: List[StudyCard]
+    cards: Tuple[StudyCard, ...]
     total_new: int
     total_review: int
     total_learning: int
@@ -164,17 +254,31 @@ class StudyProgress(BaseModel):
     total_cards: int
     correct_answers: int
     incorrect_answers: int
-    accuracy: float
-    average_response_time: float
+    total_response_time: float = 0.0  # in seconds
     time_remaining: Optional[int] = None  # in seconds
+    
+    @computed_field
+    @property
+    def accuracy(self) -> float:
+        answered = self.correct_answers + self.incorrect_answers
+        return self.correct_answers / answered if answered else 0.0
+    
+    @computed_field
+    @property
+    def average_response_time(self) -> float:
+        return self.total_response_time / self.completed_cards if self.completed_cards else 0.0
 
 # Spaced Repetition Algorithm Schemas
 class SpacedRepetitionSettings(BaseModel):
-    initial_ease_factor: float = Field(default=2.5, ge=1.3, le=5.0)
-    minimum_ease_factor: float = Field(default=1.3, ge=1.0, le=2.0)
-    ease_bonus: float = Field(default=0.15, ge=0.0, le=1.0)
-    interval_modifier: float = Field(default=1.0, ge=0.1, le=10.0)
-    maximum_interval: int = Field(default=36500, ge=1, le=36500)  # 100 years max
+    initial_ease_factor: float = 2.5
+    minimum_ease_factor: float = 1.3
+    ease_bonus: float = 0.15
+    interval_modifier: float = 1.0
+    maximum_interval: int = 36500  # 100 years max
+    
+    @model_validator(mode="after")
+    def check_bounds(self):
+        return _check_bounds(self, SPACED_REPETITION_BOUNDS)
 
 class SpacedRepetitionResult(BaseModel):
     new_interval: int
@@ -191,16 +295,26 @@ class FlashcardStats(BaseModel):
     mastered_cards: int
     total_reviews: int
     correct_reviews: int
-    accuracy: float
-    average_response_time: float
+    timed_reviews: int = 0  # Reviews that recorded a response time
+    total_response_time: float = 0.0  # in seconds
     cards_due_today: int
     cards_due_tomorrow: int
+    
+    @computed_field
+    @property
+    def accuracy(self) -> float:
+        return self.correct_reviews / self.total_reviews if self.total_reviews else 0.0
+    
+    @computed_field
+    @property
+    def average_response_time(self) -> float:
+        return self.total_response_time / self.timed_reviews if self.timed_reviews else 0.0
 
 class DeckStats(BaseModel):
     deck: FlashcardDeck
     stats: FlashcardStats
-    recent_performance: List[Dict[str, Any]]
-    learning_curve: List[Dict[str, Any]]
+    recent_performance: Tuple[Dict[str, Any], ...]
+    learning_curve: Tuple[Dict[str, Any], ...]
 
 # Export Schemas
 class FlashcardExport(BaseModel):
@@ -208,7 +322,7 @@ class FlashcardExport(BaseModel):
     topic: str
     difficulty: str
     created_at: datetime
-    cards: List[Dict[str, Any]]
+    cards: Tuple[Dict[str, Any], ...]
     statistics: FlashcardStats
 
 # Search and Filter Schemas
@@ -221,8 +335,11 @@ class FlashcardSearch(BaseModel):
     due_before: Optional[datetime] = None
     limit: int = Field(default=50, ge=1, le=100)
     offset: int = Field(default=0, ge=0)
+    # Keyset cursor: next_cursor of the previous page; takes precedence over offset
+    cursor: Optional[int] = None
 
 class FlashcardSearchResult(BaseModel):
-    flashcards: List[Flashcard]
-    total_count: int
-    has_more: bool 
\ No newline at end of file
+    flashcards: Tuple[Flashcard, ...]
+    total_count: Optional[int] = None  # Not computed by search; use has_more for paging
+    has_more: bool 
+    next_cursor: Optional[int] = None  # Pass as cursor to fetch the next page
\ No newline at end of file
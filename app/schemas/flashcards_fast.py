@@ -0,0 +1,134 @@
+"""
+msgspec mirrors of the study-session response schemas.
+
+The /study/start endpoint returns every due card on each call, so it skips
+pydantic and encodes these structs straight to JSON bytes. The field layout
+matches StudyCard/StudySessionResponse in app.schemas.flashcards, which stay
+the documented response_model. The card and deck list endpoints and the JSON
+export, which return many rows per call, are encoded the same way.
+"""
+
+from typing import List, Optional, Tuple, Union
+from datetime import datetime
+import msgspec
+
+class FlashcardFast(msgspec.Struct, gc=False):
+    id: int
+    user_id: int
+    question_id: Optional[int]
+    front_content: str
+    back_content: str
+    hint: Optional[str]
+    tags: Tuple[str, ...]
+    status: str
+    difficulty_level: float
+    interval: int
+    ease_factor: float
+    review_count: int
+    correct_count: int
+    incorrect_count: int
+    next_review: Optional[datetime]
+    last_reviewed: Optional[datetime]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_orm(cls, card) -> "FlashcardFast":
+        """Build from a Flashcard ORM row without validation"""
+        return cls(
+            id=card.id,
+            user_id=card.user_id,
+            question_id=card.question_id,
+            front_content=card.front_content,
+            back_content=card.back_content,
+            hint=card.hint,
+            tags=tuple(card.tags or ()),
+            status=card.status.value,
+            difficulty_level=card.difficulty_level,
+            interval=card.interval,
+            ease_factor=card.ease_factor,
+            review_count=card.review_count,
+            correct_count=card.correct_count,
+            incorrect_count=card.incorrect_count,
+            next_review=card.next_review,
+            last_reviewed=card.last_reviewed,
+            created_at=card.created_at,
+            updated_at=card.updated_at
+        )
+
+class FlashcardDeckFast(msgspec.Struct, gc=False):
+    id: int
+    user_id: int
+    name: str
+    description: Optional[str]
+    topic: str
+    difficulty: str
+    daily_limit: int
+    new_cards_per_day: int
+    review_cards_per_day: int
+    total_cards: int
+    mastered_cards: int
+    learning_cards: int
+    review_cards: int
+    created_at: datetime
+    updated_at: Optional[datetime]
+    last_studied: Optional[datetime]
+
+    @classmethod
+    def from_orm(cls, deck) -> "FlashcardDeckFast":
+        """Build from a FlashcardDeck ORM row without validation"""
+        return cls(
+            id=deck.id,
+            user_id=deck.user_id,
+            name=deck.name,
+            description=deck.description,
+            topic=deck.topic,
+            difficulty=deck.difficulty,
+            daily_limit=deck.daily_limit,
+            new_cards_per_day=deck.new_cards_per_day,
+            review_cards_per_day=deck.review_cards_per_day,
+            total_cards=deck.total_cards,
+            mastered_cards=deck.mastered_cards,
+            learning_cards=deck.learning_cards,
+            review_cards=deck.review_cards,
+            created_at=deck.created_at,
+            updated_at=None,  # Decks do not track updates
+            last_studied=deck.last_studied
+        )
+
+class ExportedFlashcardFast(FlashcardFast, gc=False):
+    """A flashcard as exported: the Flashcard fields plus its topic"""
+    topic: str = ""
+
+    @classmethod
+    def from_orm(cls, card) -> "ExportedFlashcardFast":
+        exported = super().from_orm(card)
+        exported.topic = card.topic
+        return exported
+
+class FlashcardExportFast(msgspec.Struct, gc=False):
+    format: str
+    data: List[ExportedFlashcardFast]
+    filename: str
+
+class StudyCardFast(msgspec.Struct, gc=False):
+    flashcard: FlashcardFast
+    is_new: bool
+    is_review: bool
+    is_learning: bool
+    interval: int
+    ease_factor: float
+
+class StudySessionResponseFast(msgspec.Struct, gc=False):
+    session_id: str
+    cards: List[StudyCardFast]
+    total_new: int
+    total_review: int
+    total_learning: int
+    session_type: str
+
+_encoder = msgspec.json.Encoder()
+
+def encode_json(obj: Union[msgspec.Struct, List[msgspec.Struct]]) -> bytes:
+    """Encode a fast struct, or a list of them, to JSON bytes"""
+    return _encoder.encode(obj)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -36,12 +36,11 @@ class Quiz(BaseModel):
     completed_at: Optional[datetime] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserAnswerCreate(BaseModel):
     question_id: int
-    selected_answer: str
+    selected_answer: int  # Index of the chosen option; numeric strings are accepted
     time_taken: Optional[float] = None
 
 class QuizResult(BaseModel):
@@ -1,13 +1,19 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
-from datetime import datetime, timedelta
+from sqlalchemy import func, desc, and_, case, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import asyncio
 import json
+import re
 import statistics
 from app.models.analytics import (
     UserProgress, TopicAnalytics, DifficultyAnalytics, QuizHistory,
-    QuestionAnalytics, LearningPath, DifficultyLevel, TopicCategory
+    QuestionAnalytics, LearningPath, UserDashboardCache, DifficultyLevel, TopicCategory
 )
+from app.core.cache import cache_get, cache_set, cache_delete, get_redis
 from app.models.quiz import Quiz, Question, UserAnswer
 from app.models.user import User
 from app.schemas.analytics import (
@@ -15,17 +21,173 @@ from app.schemas.analytics import (
     WeakAreaAnalysis, LearningRecommendation, QuizHistory as QuizHistorySchema
 )
 
+# Most recent quizzes included in the dashboard's quiz_history
+DASHBOARD_HISTORY_LIMIT = 50
+
+# Seconds a dashboard stays cached; record_quiz_completion invalidates it sooner
+DASHBOARD_CACHE_TTL = 300
+
+# Seconds a UserDashboardCache row is trusted; older rows are rebuilt and rewritten, which
+# picks up changes made outside quiz completion (learning paths, progress edits)
+DASHBOARD_ROW_MAX_AGE = 3600
+
+# Attempts kept in DifficultyAnalytics.improvement_trend
+IMPROVEMENT_TREND_LIMIT = 100
+
+# Difficulty to move on to once a user is ready; Hard has nowhere further to go
+NEXT_DIFFICULTY = {'Easy': 'Medium', 'Medium': 'Hard'}
+
+# Question-text keywords used to label a breakdown entry; the first match wins
+BREAKDOWN_CONCEPTS = [
+    ('variable', 'Variables'),
+    ('function', 'Functions'),
+    ('loop', 'Loops'),
+    ('array', 'Arrays'),
+]
+
+# Topic keywords per category, matched against whole words; categories are tried in order.
+# Compound forms are listed explicitly ("biochemistry", "mathematical"): matching keywords
+# inside longer words would also match "javanese" or "novelty"
+CATEGORY_KEYWORDS = [
+    (TopicCategory.PROGRAMMING, ['python', 'javascript', 'java', 'programming', 'coding', 'algorithm', 'algorithms', 'algorithmic']),
+    (TopicCategory.MATHEMATICS, ['math', 'maths', 'mathematics', 'mathematical', 'algebra', 'calculus', 'geometry', 'statistics']),
+    (TopicCategory.SCIENCE, ['physics', 'chemistry', 'biology', 'science', 'biochemistry', 'biophysics', 'geophysics', 'astrophysics', 'neuroscience']),
+    (TopicCategory.HISTORY, ['history', 'historical', 'ancient', 'medieval', 'prehistory', 'prehistoric']),
+    (TopicCategory.LITERATURE, ['literature', 'poetry', 'novel', 'novels', 'writing']),
+    (TopicCategory.LANGUAGES, ['language', 'languages', 'english', 'spanish', 'french', 'grammar']),
+    (TopicCategory.BUSINESS, ['business', 'economics', 'microeconomics', 'macroeconomics', 'finance', 'management']),
+    (TopicCategory.TECHNOLOGY, ['technology', 'ai', 'machine learning', 'data science']),
+]
+
+# (category, single-word keywords, multi-word keywords as token sets)
+CATEGORY_TOKENS = [
+    (
+        category,
+        frozenset(word for word in words if ' ' not in word),
+        tuple(frozenset(word.split()) for word in words if ' ' in word)
+    )
+    for category, words in CATEGORY_KEYWORDS
+]
+
+TOPIC_TOKEN_PATTERN = re.compile(r'[a-z]+')
+
+@lru_cache(maxsize=2048)
+def _categorize_normalized_topic(topic_lower: str) -> TopicCategory:
+    """Categorize a lowercased topic; cached since the same topics recur constantly"""
+    tokens = frozenset(TOPIC_TOKEN_PATTERN.findall(topic_lower))
+    for category, words, phrases in CATEGORY_TOKENS:
+        if tokens & words or any(phrase <= tokens for phrase in phrases):
+            return category
+    
+    return TopicCategory.OTHER
+
+def _is_fresh(updated_at: Optional[datetime], max_age: int) -> bool:
+    """Whether a database timestamp is within max_age seconds of now"""
+    if updated_at is None:
+        return False
+    # SQLite hands back naive UTC timestamps (CURRENT_TIMESTAMP); Postgres aware ones
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - updated_at <= timedelta(seconds=max_age)
+
+def _get_user_progress(db: Session, user_id: int) -> UserProgress:
+    """Get or create the user's progress row, memoized on the request's session"""
+    
+    # Sessions are opened per request (see get_db), so session.info is request-scoped
+    key = ('user_progress', user_id)
+    user_progress = db.info.get(key)
+    if user_progress is None:
+        user_progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+        if not user_progress:
+            user_progress = UserProgress(user_id=user_id)
+            db.add(user_progress)
+            db.flush()
+        db.info[key] = user_progress
+    
+    return user_progress
+
+def _bundle_keys(user_id: int, topic: str, difficulty: DifficultyLevel) -> Tuple[tuple, tuple, tuple]:
+    """session.info keys for the rows loaded by _load_analytics_bundle"""
+    return (
+        ('user_progress', user_id),
+        ('topic_analytics', user_id, topic),
+        ('difficulty_analytics', user_id, difficulty),
+    )
+
+def _load_analytics_bundle(
+    db: Session, user_id: int, topic: str, difficulty: DifficultyLevel
+) -> Tuple[UserProgress, Optional[TopicAnalytics], Optional[DifficultyAnalytics]]:
+    """Load and lock the user's progress with its topic and difficulty analytics in one query"""
+    
+    # Locking the progress row serializes concurrent completions for the same user,
+    # so the running averages below never lose an update. Postgres refuses FOR UPDATE
+    # on the nullable side of an outer join, hence OF user_progress.
+    row = db.query(UserProgress, TopicAnalytics, DifficultyAnalytics).outerjoin(
+        TopicAnalytics,
+        and_(TopicAnalytics.user_id == UserProgress.user_id, TopicAnalytics.topic == topic)
+    ).outerjoin(
+        DifficultyAnalytics,
+        and_(DifficultyAnalytics.user_id == UserProgress.user_id, DifficultyAnalytics.difficulty == difficulty)
+    ).filter(
+        UserProgress.user_id == user_id
+    ).with_for_update(of=UserProgress).first()
+    
+    if row:
+        bundle = tuple(row)
+    else:
+        user_progress = UserProgress(user_id=user_id)
+        db.add(user_progress)
+        db.flush()
+        bundle = (user_progress, None, None)
+    
+    # The update helpers pick these up instead of querying again
+    for key, value in zip(_bundle_keys(user_id, topic, difficulty), bundle):
+        db.info[key] = value
+    
+    return bundle
+
 class AnalyticsService:
     
+    @staticmethod
+    async def record_quiz_completion(db: Session, user_id: int, quiz_id: int, quiz_result: Dict[str, Any]):
+        """Record all analytics for a completed quiz in a single transaction"""
+        
+        # The update helpers only flush, so everything below commits (or rolls back) together.
+        # Their queries only read quiz history and answers, so the changed analytics rows
+        # are held back and written once each by create_quiz_history's flush instead of
+        # being flushed again before every query.
+        difficulty = DifficultyLevel(quiz_result['difficulty'])
+        try:
+            with db.no_autoflush:
+                _load_analytics_bundle(db, user_id, quiz_result['topic'], difficulty)
+                await AnalyticsService.update_user_progress(db, user_id, quiz_result)
+                await AnalyticsService.update_topic_analytics(db, user_id, quiz_result)
+                await AnalyticsService.update_difficulty_analytics(db, user_id, quiz_result)
+                quiz_history = await AnalyticsService.create_quiz_history(db, user_id, quiz_id, quiz_result)
+            
+            # Refresh the pre-computed dashboard from the rows flushed above
+            dashboard = await AnalyticsService._build_analytics_dashboard(db, user_id)
+            AnalyticsService._store_dashboard_cache(db, user_id, dashboard)
+            
+            # Commit off the event loop; the session is not touched again until it returns
+            await asyncio.to_thread(db.commit)
+        except Exception:
+            db.rollback()
+            # Rows loaded or created in this transaction are no longer valid
+            for key in _bundle_keys(user_id, quiz_result['topic'], difficulty):
+                db.info.pop(key, None)
+            raise
+        
+        await cache_delete(f"dash:{user_id}")
+        
+        return quiz_history
+    
     @staticmethod
     async def update_user_progress(db: Session, user_id: int, quiz_result: Dict[str, Any]):
         """Update user progress after quiz completion"""
         
         # Get or create user progress
-        user_progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
-        if not user_progress:
-            user_progress = UserProgress(user_id=user_id)
-            db.add(user_progress)
+        user_progress = _get_user_progress(db, user_id)
         
         # Update overall statistics
         user_progress.total_quizzes_taken += 1
@@ -57,25 +219,15 @@ class AnalyticsService:
         user_progress.longest_streak = max(user_progress.longest_streak, user_progress.current_streak)
         user_progress.last_quiz_date = datetime.now()
         
-        # Update topics covered
+        # Update topics covered (a MutableList, so the append is tracked)
+        if user_progress.topics_covered is None:
+            user_progress.topics_covered = []
         if quiz_result['topic'] not in user_progress.topics_covered:
             user_progress.topics_covered.append(quiz_result['topic'])
         
-        # Update difficulty progress
-        difficulty = quiz_result['difficulty']
-        if difficulty not in user_progress.difficulty_progress:
-            user_progress.difficulty_progress[difficulty] = 0.0
-        
-        # Calculate difficulty progress (average score for this difficulty)
-        difficulty_quizzes = db.query(Quiz).filter(
-            and_(Quiz.user_id == user_id, Quiz.difficulty == difficulty)
-        ).all()
-        
-        if difficulty_quizzes:
-            avg_difficulty_score = sum(q.score or 0 for q in difficulty_quizzes) / len(difficulty_quizzes)
-            user_progress.difficulty_progress[difficulty] = avg_difficulty_score
+        # Difficulty progress is kept in step by update_difficulty_analytics,
+        # which already tracks the running average score per difficulty
         
-        db.commit()
         return user_progress
     
     @staticmethod
@@ -85,13 +237,17 @@ class AnalyticsService:
         topic = quiz_result['topic']
         category = AnalyticsService._categorize_topic(topic)
         
-        # Get or create topic analytics
-        topic_analytics = db.query(TopicAnalytics).filter(
-            and_(TopicAnalytics.user_id == user_id, TopicAnalytics.topic == topic)
-        ).first()
+        # Get or create topic analytics, reusing the row from _load_analytics_bundle if loaded
+        key = ('topic_analytics', user_id, topic)
+        if key in db.info:
+            topic_analytics = db.info[key]
+        else:
+            topic_analytics = db.query(TopicAnalytics).filter(
+                and_(TopicAnalytics.user_id == user_id, TopicAnalytics.topic == topic)
+            ).first()
         
         if not topic_analytics:
-            user_progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+            user_progress = _get_user_progress(db, user_id)
             topic_analytics = TopicAnalytics(
                 user_id=user_id,
                 user_progress_id=user_progress.id,
@@ -99,6 +255,8 @@ class AnalyticsService:
                 category=category
             )
             db.add(topic_analytics)
+            db.flush()
+        db.info[key] = topic_analytics
         
         # Update metrics
         topic_analytics.quizzes_taken += 1
@@ -134,7 +292,6 @@ class AnalyticsService:
         topic_analytics.weak_areas = weak_areas
         topic_analytics.recommended_topics = AnalyticsService._get_recommended_topics(weak_areas)
         
-        db.commit()
         return topic_analytics
     
     @staticmethod
@@ -142,20 +299,26 @@ class AnalyticsService:
         """Update difficulty-specific analytics"""
         
         difficulty = DifficultyLevel(quiz_result['difficulty'])
+        user_progress = _get_user_progress(db, user_id)
         
-        # Get or create difficulty analytics
-        difficulty_analytics = db.query(DifficultyAnalytics).filter(
-            and_(DifficultyAnalytics.user_id == user_id, DifficultyAnalytics.difficulty == difficulty)
-        ).first()
+        # Get or create difficulty analytics, reusing the row from _load_analytics_bundle if loaded
+        key = ('difficulty_analytics', user_id, difficulty)
+        if key in db.info:
+            difficulty_analytics = db.info[key]
+        else:
+            difficulty_analytics = db.query(DifficultyAnalytics).filter(
+                and_(DifficultyAnalytics.user_id == user_id, DifficultyAnalytics.difficulty == difficulty)
+            ).first()
         
         if not difficulty_analytics:
-            user_progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
             difficulty_analytics = DifficultyAnalytics(
                 user_id=user_id,
                 user_progress_id=user_progress.id,
                 difficulty=difficulty
             )
             db.add(difficulty_analytics)
+            db.flush()
+        db.info[key] = difficulty_analytics
         
         # Update metrics
         difficulty_analytics.quizzes_taken += 1
@@ -193,7 +356,10 @@ class AnalyticsService:
             'score': quiz_result['score'],
             'time_taken': quiz_result['time_taken']
         }
-        difficulty_analytics.improvement_trend.append(trend_data)
+        # Keep only the latest attempts so the JSON column stays small
+        difficulty_analytics.improvement_trend = (
+            (difficulty_analytics.improvement_trend or []) + [trend_data]
+        )[-IMPROVEMENT_TREND_LIMIT:]
         
         # Calculate readiness score for next difficulty
         difficulty_analytics.readiness_score = AnalyticsService._calculate_readiness_score(
@@ -202,42 +368,52 @@ class AnalyticsService:
             difficulty_analytics.quizzes_taken
         )
         
-        db.commit()
+        # Mirror the running average into the user's difficulty progress
+        user_progress.difficulty_progress = {
+            **(user_progress.difficulty_progress or {}),
+            quiz_result['difficulty']: difficulty_analytics.average_score
+        }
+        
         return difficulty_analytics
     
     @staticmethod
     async def create_quiz_history(db: Session, user_id: int, quiz_id: int, quiz_result: Dict[str, Any]):
         """Create detailed quiz history entry"""
         
-        # Get quiz details
-        quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-        
-        # Create question breakdown
+        # Create question breakdown, loading each answer with its question in one query
         question_breakdown = []
-        user_answers = db.query(UserAnswer).filter(
+        answered_questions = db.query(UserAnswer, Question).join(
+            Question, Question.id == UserAnswer.question_id
+        ).filter(
             and_(UserAnswer.user_id == user_id, UserAnswer.quiz_id == quiz_id)
         ).all()
         
-        for user_answer in user_answers:
-            question = db.query(Question).filter(Question.id == user_answer.question_id).first()
+        # Time metrics are accumulated while the breakdown is built
+        total_time = 0
+        questions_answered_quickly = 0
+        questions_answered_slowly = 0
+        
+        for user_answer, question in answered_questions:
+            time_taken = user_answer.time_taken or 0
+            total_time += time_taken
+            if time_taken < 30:
+                questions_answered_quickly += 1
+            elif time_taken > 120:
+                questions_answered_slowly += 1
+            
             question_breakdown.append({
                 'question_id': question.id,
                 'question_text': question.question_text,
                 'user_answer': user_answer.selected_answer,
                 'correct_answer': question.correct_answer,
                 'is_correct': user_answer.is_correct,
-                'time_taken': user_answer.time_taken or 0
+                'time_taken': time_taken
             })
         
-        # Analyze performance
-        weak_areas = AnalyticsService._identify_weak_areas_from_breakdown(question_breakdown)
-        strengths = AnalyticsService._identify_strengths_from_breakdown(question_breakdown)
+        avg_time_per_question = total_time / len(question_breakdown) if question_breakdown else 0
         
-        # Calculate time metrics
-        times = [q['time_taken'] for q in question_breakdown]
-        avg_time_per_question = statistics.mean(times) if times else 0
-        questions_answered_quickly = len([t for t in times if t < 30])
-        questions_answered_slowly = len([t for t in times if t > 120])
+        # Analyze performance
+        weak_areas, strengths = AnalyticsService._classify_breakdown(question_breakdown)
         
         # Determine next recommended difficulty
         next_difficulty = AnalyticsService._recommend_next_difficulty(
@@ -249,7 +425,7 @@ class AnalyticsService:
             user_id=user_id,
             quiz_id=quiz_id,
             topic=quiz_result['topic'],
-            difficulty=DifficultyLevel(quiz_result['difficulty']),
+            difficulty=quiz_result['difficulty'],
             num_questions=quiz_result['total_questions'],
             time_limit=quiz_result['time_limit'],
             score=quiz_result['score'],
@@ -267,17 +443,65 @@ class AnalyticsService:
             next_recommended_difficulty=next_difficulty,
             concepts_mastered=strengths,
             concepts_to_review=weak_areas,
-            recommended_next_topics=AnalyticsService._get_recommended_topics(weak_areas)
+            recommended_next_topics=AnalyticsService._get_recommended_topics(weak_areas),
+            completed_at=func.now()
         )
         
         db.add(quiz_history)
-        db.commit()
+        db.flush()
         return quiz_history
     
     @staticmethod
     async def get_analytics_dashboard(db: Session, user_id: int) -> AnalyticsDashboard:
         """Get comprehensive analytics dashboard for user"""
         
+        # complete_quiz drops this key (via record_quiz_completion) once the new results commit.
+        # Only Redis is used: a per-worker copy can't see invalidations from other workers,
+        # and the dashboard row below is already a single primary-key read.
+        cache_key = f"dash:{user_id}"
+        shared_cache = get_redis() is not None
+        if shared_cache:
+            cached = await cache_get(cache_key)
+            if cached is not None:
+                return AnalyticsDashboard.model_validate_json(cached)
+        
+        # Otherwise serve the row written by record_quiz_completion while it is fresh
+        row = db.query(UserDashboardCache.summary_json, UserDashboardCache.updated_at).filter(
+            UserDashboardCache.user_id == user_id
+        ).first()
+        if row is not None and _is_fresh(row.updated_at, DASHBOARD_ROW_MAX_AGE):
+            dashboard = AnalyticsDashboard.model_validate(row.summary_json)
+        else:
+            dashboard = await AnalyticsService._build_analytics_dashboard(db, user_id)
+            # Save the rebuild so the next miss doesn't repeat it
+            try:
+                AnalyticsService._store_dashboard_cache(db, user_id, dashboard)
+                await asyncio.to_thread(db.commit)
+            except Exception as e:
+                db.rollback()
+                print(f"Warning: could not save dashboard for user {user_id}: {e}")
+        
+        if shared_cache:
+            await cache_set(cache_key, dashboard.model_dump_json(), DASHBOARD_CACHE_TTL)
+        return dashboard
+    
+    @staticmethod
+    def _store_dashboard_cache(db: Session, user_id: int, dashboard: AnalyticsDashboard):
+        """Upsert the user's pre-computed dashboard"""
+        insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(UserDashboardCache).values(
+            user_id=user_id,
+            summary_json=dashboard.model_dump(mode="json")
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[UserDashboardCache.user_id],
+            set_={'summary_json': stmt.excluded.summary_json, 'updated_at': func.now()}
+        ))
+    
+    @staticmethod
+    async def _build_analytics_dashboard(db: Session, user_id: int) -> AnalyticsDashboard:
+        """Compute the analytics dashboard from the analytics tables"""
+        
         # Get user progress
         user_progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
         if not user_progress:
@@ -309,10 +533,13 @@ class AnalyticsService:
             DifficultyAnalytics.user_id == user_id
         ).all()
         
-        # Get recent quizzes
-        recent_quizzes = db.query(QuizHistory).filter(
-            QuizHistory.user_id == user_id
-        ).order_by(desc(QuizHistory.completed_at)).limit(10).all()
+        # Get quiz history once; older entries are paged through /analytics/history
+        quiz_history = db.query(QuizHistory).filter(
+            and_(QuizHistory.user_id == user_id, QuizHistory.completed_at.isnot(None))
+        ).order_by(desc(QuizHistory.completed_at)).limit(DASHBOARD_HISTORY_LIMIT).all()
+        
+        # Recent quizzes are the head of the same ordering
+        recent_quizzes = quiz_history[:10]
         
         # Get performance trends
         performance_trends = AnalyticsService._get_performance_trends(db, user_id)
@@ -325,11 +552,6 @@ class AnalyticsService:
             user_progress, topic_performance, difficulty_performance, weak_areas
         )
         
-        # Get quiz history
-        quiz_history = db.query(QuizHistory).filter(
-            QuizHistory.user_id == user_id
-        ).order_by(desc(QuizHistory.completed_at)).all()
-        
         # Get learning paths
         learning_paths = db.query(LearningPath).filter(
             and_(LearningPath.user_id == user_id, LearningPath.is_active == True)
@@ -365,47 +587,48 @@ class AnalyticsService:
     @staticmethod
     def _categorize_topic(topic: str) -> TopicCategory:
         """Categorize topic into predefined categories"""
-        topic_lower = topic.lower()
-        
-        if any(word in topic_lower for word in ['python', 'javascript', 'java', 'programming', 'coding', 'algorithm']):
-            return TopicCategory.PROGRAMMING
-        elif any(word in topic_lower for word in ['math', 'algebra', 'calculus', 'geometry', 'statistics']):
-            return TopicCategory.MATHEMATICS
-        elif any(word in topic_lower for word in ['physics', 'chemistry', 'biology', 'science']):
-            return TopicCategory.SCIENCE
-        elif any(word in topic_lower for word in ['history', 'historical', 'ancient', 'medieval']):
-            return TopicCategory.HISTORY
-        elif any(word in topic_lower for word in ['literature', 'poetry', 'novel', 'writing']):
-            return TopicCategory.LITERATURE
-        elif any(word in topic_lower for word in ['language', 'english', 'spanish', 'french', 'grammar']):
-            return TopicCategory.LANGUAGES
-        elif any(word in topic_lower for word in ['business', 'economics', 'finance', 'management']):
-            return TopicCategory.BUSINESS
-        elif any(word in topic_lower for word in ['technology', 'ai', 'machine learning', 'data science']):
-            return TopicCategory.TECHNOLOGY
-        else:
-            return TopicCategory.OTHER
+        return _categorize_normalized_topic(topic.lower())
     
     @staticmethod
     def _calculate_improvement_rate(db: Session, user_id: int, topic: str) -> float:
         """Calculate improvement rate for a topic"""
-        topic_quizzes = db.query(QuizHistory).filter(
-            and_(QuizHistory.user_id == user_id, QuizHistory.topic == topic)
-        ).order_by(QuizHistory.completed_at).all()
+        # Number the topic's quizzes chronologically so the database can average each half
+        ranked = db.query(
+            QuizHistory.score.label("score"),
+            func.row_number().over(order_by=QuizHistory.completed_at).label("position"),
+            func.count().over().label("total")
+        ).filter(
+            and_(
+                QuizHistory.user_id == user_id,
+                QuizHistory.topic == topic,
+                QuizHistory.completed_at.isnot(None)
+            )
+        ).subquery()
         
-        if len(topic_quizzes) < 2:
+        in_first_half = ranked.c.position * 2 <= ranked.c.total
+        avg_first, avg_second, total = db.query(
+            func.avg(case((in_first_half, ranked.c.score))),
+            func.avg(case((~in_first_half, ranked.c.score))),
+            func.max(ranked.c.total)
+        ).one()
+        
+        if not total or total < 2 or not avg_first or avg_first <= 0:
             return 0.0
         
-        scores = [q.score for q in topic_quizzes]
-        if len(scores) >= 2:
-            first_half = scores[:len(scores)//2]
-            second_half = scores[len(scores)//2:]
-            
-            if first_half and second_half:
-                avg_first = statistics.mean(first_half)
-                avg_second = statistics.mean(second_half)
-                if avg_first > 0:
-                    return ((avg_second - avg_first) / avg_first) * 100
+        return ((avg_second - avg_first) / avg_first) * 100
+    
+    @staticmethod
+    def _half_split_improvement(scores: List[float]) -> float:
+        """Percentage change between the mean of the second and first half of the scores"""
+        if len(scores) < 2:
+            return 0.0
+        
+        middle = len(scores) // 2
+        # fmean works in floats; statistics.mean's exact fractions are far slower
+        avg_first = statistics.fmean(scores[:middle])
+        avg_second = statistics.fmean(scores[middle:])
+        if avg_first > 0:
+            return ((avg_second - avg_first) / avg_first) * 100
         
         return 0.0
     
@@ -418,7 +641,11 @@ class AnalyticsService:
         
         # Get recent quiz history for this topic
         recent_quizzes = db.query(QuizHistory).filter(
-            and_(QuizHistory.user_id == user_id, QuizHistory.topic == topic)
+            and_(
+                QuizHistory.user_id == user_id,
+                QuizHistory.topic == topic,
+                QuizHistory.completed_at.isnot(None)
+            )
         ).order_by(desc(QuizHistory.completed_at)).limit(5).all()
         
         for quiz in recent_quizzes:
@@ -462,47 +689,23 @@ class AnalyticsService:
         return score_component + time_component + consistency_component
     
     @staticmethod
-    def _identify_weak_areas_from_breakdown(question_breakdown: List[Dict]) -> List[str]:
-        """Identify weak areas from question breakdown"""
-        weak_areas = []
+    def _classify_breakdown(question_breakdown: List[Dict]) -> Tuple[List[str], List[str]]:
+        """Split the concepts in a question breakdown into (weak areas, strengths)"""
+        weak_areas = set()
+        strengths = set()
         
         for question in question_breakdown:
-            if not question['is_correct']:
-                # Extract concept from question text (simplified)
-                question_text = question['question_text'].lower()
-                if 'variable' in question_text:
-                    weak_areas.append('Variables')
-                elif 'function' in question_text:
-                    weak_areas.append('Functions')
-                elif 'loop' in question_text:
-                    weak_areas.append('Loops')
-                elif 'array' in question_text:
-                    weak_areas.append('Arrays')
-                else:
-                    weak_areas.append('General Concepts')
-        
-        return list(set(weak_areas))
-    
-    @staticmethod
-    def _identify_strengths_from_breakdown(question_breakdown: List[Dict]) -> List[str]:
-        """Identify strengths from question breakdown"""
-        strengths = []
+            # Extract concept from question text (simplified)
+            question_text = question['question_text'].lower()
+            concept = 'General Concepts'
+            for keyword, label in BREAKDOWN_CONCEPTS:
+                if keyword in question_text:
+                    concept = label
+                    break
+            
+            (strengths if question['is_correct'] else weak_areas).add(concept)
         
-        for question in question_breakdown:
-            if question['is_correct']:
-                question_text = question['question_text'].lower()
-                if 'variable' in question_text:
-                    strengths.append('Variables')
-                elif 'function' in question_text:
-                    strengths.append('Functions')
-                elif 'loop' in question_text:
-                    strengths.append('Loops')
-                elif 'array' in question_text:
-                    strengths.append('Arrays')
-                else:
-                    strengths.append('General Concepts')
-        
-        return list(set(strengths))
+        return list(weak_areas), list(strengths)
     
     @staticmethod
     def _recommend_next_difficulty(current_difficulty: str, score: float, accuracy: float) -> Optional[str]:
@@ -519,49 +722,40 @@ class AnalyticsService:
     @staticmethod
     def _get_performance_trends(db: Session, user_id: int) -> List[PerformanceTrend]:
         """Get performance trends over time"""
-        recent_quizzes = db.query(QuizHistory).filter(
-            QuizHistory.user_id == user_id
-        ).order_by(QuizHistory.completed_at).limit(30).all()
-        
-        trends = []
-        for quiz in recent_quizzes:
-            trends.append(PerformanceTrend(
-                date=quiz.completed_at,
-                score=quiz.score,
-                accuracy=quiz.accuracy,
-                time_taken=quiz.time_taken,
-                topic=quiz.topic,
-                difficulty=quiz.difficulty.value
-            ))
-        
-        return trends
+        # Only the plotted columns; the question_breakdown JSON is never loaded
+        recent_quizzes = db.query(
+            QuizHistory.completed_at,
+            QuizHistory.score,
+            QuizHistory.accuracy,
+            QuizHistory.time_taken,
+            QuizHistory.topic,
+            QuizHistory.difficulty
+        ).filter(
+            and_(QuizHistory.user_id == user_id, QuizHistory.completed_at.isnot(None))
+        ).order_by(desc(QuizHistory.completed_at), desc(QuizHistory.id)).limit(30).all()
+        
+        # Latest 30 quizzes, oldest first
+        return [
+            PerformanceTrend(
+                date=completed_at,
+                score=score,
+                accuracy=accuracy,
+                time_taken=time_taken,
+                topic=topic,
+                difficulty=difficulty
+            )
+            for completed_at, score, accuracy, time_taken, topic, difficulty in reversed(recent_quizzes)
+        ]
     
     @staticmethod
     def _get_weak_areas_analysis(db: Session, user_id: int) -> List[WeakAreaAnalysis]:
         """Get detailed weak areas analysis"""
         weak_areas = []
         
-        # Get all quiz history for analysis
-        quiz_history = db.query(QuizHistory).filter(
-            QuizHistory.user_id == user_id
-        ).all()
-        
-        # Analyze weak areas across all quizzes
-        concept_errors = {}
-        concept_attempts = {}
-        
-        for quiz in quiz_history:
-            for area in quiz.weak_areas_identified:
-                if area not in concept_errors:
-                    concept_errors[area] = 0
-                    concept_attempts[area] = 0
-                
-                concept_errors[area] += 1
-                concept_attempts[area] += 1
-        
-        # Create weak area analysis
-        for concept, errors in concept_errors.items():
-            attempts = concept_attempts[concept]
+        # Count weak areas across all quizzes in the database rather than loading every history row
+        for concept, attempts in AnalyticsService._count_weak_areas(db, user_id):
+            # Every time an area is flagged counts as one failed attempt
+            errors = attempts
             error_rate = errors / attempts if attempts > 0 else 0
             
             if error_rate > 0.3:  # Only include areas with >30% error rate
@@ -576,6 +770,30 @@ class AnalyticsService:
         
         return weak_areas
     
+    @staticmethod
+    def _count_weak_areas(db: Session, user_id: int) -> List[Tuple[str, int]]:
+        """Count how often each weak area was identified, most frequent first"""
+        table = QuizHistory.__tablename__
+        
+        # Unnest the JSON list with the dialect's table-valued function
+        if db.get_bind().dialect.name == "postgresql":
+            elements = f"jsonb_array_elements_text({table}.weak_areas_identified) AS area"
+            area = "area"
+        else:
+            elements = f"json_each({table}.weak_areas_identified)"
+            area = "json_each.value"
+        
+        rows = db.execute(
+            text(
+                f"SELECT {area}, COUNT(*) AS occurrences FROM {table}, {elements} "
+                f"WHERE {table}.user_id = :user_id "
+                f"GROUP BY {area} ORDER BY occurrences DESC"
+            ),
+            {"user_id": user_id}
+        ).all()
+        
+        return [(concept, occurrences) for concept, occurrences in rows]
+    
     @staticmethod
     def _get_learning_recommendations(
         user_progress: UserProgress,
@@ -658,20 +876,18 @@ class AnalyticsService:
             insights['consistency_score'] = 100 - statistics.stdev(scores) if len(scores) > 1 else 100
         
         # Calculate improvement rate
-        if len(recent_quizzes) >= 2:
-            first_half = recent_quizzes[:len(recent_quizzes)//2]
-            second_half = recent_quizzes[len(recent_quizzes)//2:]
-            
-            if first_half and second_half:
-                avg_first = statistics.mean([q.score for q in first_half])
-                avg_second = statistics.mean([q.score for q in second_half])
-                if avg_first > 0:
-                    insights['improvement_rate'] = ((avg_second - avg_first) / avg_first) * 100
+        insights['improvement_rate'] = AnalyticsService._half_split_improvement(
+            [q.score for q in recent_quizzes]
+        )
         
         # Determine learning style
-        if user_progress.average_time_spent > 20:  # More than 20 minutes average
+        average_time_spent = (
+            user_progress.total_time_spent / user_progress.total_quizzes_taken
+            if user_progress.total_quizzes_taken else 0.0
+        )
+        if average_time_spent > 20:  # More than 20 minutes average
             insights['learning_style'] = 'thorough'
-        elif user_progress.average_time_spent < 10:  # Less than 10 minutes average
+        elif average_time_spent < 10:  # Less than 10 minutes average
             insights['learning_style'] = 'quick'
         
         # Generate recommended actions
@@ -689,14 +905,7 @@ class AnalyticsService:
     @staticmethod
     def _get_next_difficulty(current: str) -> Optional[str]:
         """Get next difficulty level"""
-        difficulties = ['Easy', 'Medium', 'Hard']
-        try:
-            current_index = difficulties.index(current)
-            if current_index < len(difficulties) - 1:
-                return difficulties[current_index + 1]
-        except ValueError:
-            pass
-        return None
+        return NEXT_DIFFICULTY.get(current)
     
     @staticmethod
     def _get_resources_for_concept(concept: str) -> List[str]:
@@ -1,38 +1,82 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_, text
-from datetime import datetime, timedelta
+from sqlalchemy import func, desc, and_, or_, text, update, bindparam, exists, literal_column
+from datetime import datetime, timedelta, timezone
 import json
 import asyncio
+import weakref
+import msgspec
 from fastapi import WebSocket, WebSocketDisconnect
 from app.models.chat import (
     ChatRoom, ChatMessage, ChatParticipant, StudyGroup,
     StudyGroupMember, ChatNotification, MessageType, ChatRoomType
 )
+from app.core.database import SessionLocal, engine
+from app.core.cache import cache_get, cache_set, cache_add, get_redis, disable_redis, RedisError, REDIS_AVAILABLE
 from app.models.user import User
 from app.schemas.chat import (
     ChatRoomCreate, ChatMessageCreate, TopicSuggestionCreate,
-    StudyGroupCreate, ChatSearch, MessageSearch
+    StudyGroupCreate, ChatSearch, MessageSearch, ChatMessage as ChatMessageSchema
 )
 
+# Seconds the global and per-room stats may be served from cache
+CHAT_STATS_CACHE_TTL = 30
+
+# WebSocket sends awaited together per broadcast batch
+BROADCAST_BATCH_SIZE = 50
+
+# Room broadcasts are published on chat:room:<room_id> so every worker can deliver them
+ROOM_CHANNEL_PREFIX = "chat:room:"
+
+# On Postgres, room broadcasts are NOTIFYs on this channel instead, so a sent message is
+# broadcast exactly when its transaction commits. Payloads are "f:<room_id>:<frame>", or
+# "m:<room_id>:<message_id>" for a message whose frame is too large (listeners load it).
+PG_ROOM_CHANNEL = "chat_rooms"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+PG_NOTIFY_MAX_PAYLOAD = 7999
+
+# Shorter message searches use an unindexed ILIKE substring match instead of full-text
+MIN_FULL_TEXT_QUERY_LENGTH = 3
+
+# Seconds between batched writes of participants' last_read_at
+READ_FLUSH_INTERVAL = 2
+
+# Newest messages per room kept in a Redis list (chat:recent:<room_id>) for history reads
+RECENT_MESSAGES_PREFIX = "chat:recent:"
+RECENT_MESSAGES_LIMIT = 500
+# Lists are rebuilt from the database this often; sends don't extend it, so drift is bounded
+RECENT_MESSAGES_TTL = 60
+
+# Seconds between background refreshes of the mv_popular_topics view (Postgres)
+POPULAR_TOPICS_REFRESH_INTERVAL = 60
+
+# Encodes WebSocket events; handles datetimes and enums without a JSON-mode pass first
+_event_encoder = msgspec.json.Encoder()
+
 class ChatService:
     
     def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.room_connections: Dict[int, List[WebSocket]] = {}
+        # Weak sets: a socket whose handler has gone away drops out even if disconnect never ran.
+        # Mutations never await, so they are atomic on the event loop and need no locks.
+        self.active_connections: Dict[int, "weakref.WeakSet[WebSocket]"] = {}
+        self.room_connections: Dict[int, "weakref.WeakSet[WebSocket]"] = {}
+        self._room_listener: Optional[asyncio.Task] = None
+        
+        # (user_id, room_id) -> last read time, written in batches by _flush_reads_periodically
+        self._pending_reads: Dict[Tuple[int, int], datetime] = {}
+        self._read_flusher: Optional[asyncio.Task] = None
+        self._topics_refresher: Optional[asyncio.Task] = None
     
     async def connect(self, websocket: WebSocket, user_id: int):
         """Connect a user to the WebSocket"""
         await websocket.accept()
         
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        self.active_connections.setdefault(user_id, weakref.WeakSet()).add(websocket)
     
     def disconnect(self, websocket: WebSocket, user_id: int):
         """Disconnect a user from the WebSocket"""
         if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
+            self.active_connections[user_id].discard(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
     
@@ -40,40 +84,285 @@ class ChatService:
         """Connect a user to a specific room"""
         await websocket.accept()
         
-        if room_id not in self.room_connections:
-            self.room_connections[room_id] = []
-        self.room_connections[room_id].append(websocket)
+        self.room_connections.setdefault(room_id, weakref.WeakSet()).add(websocket)
+        self._ensure_room_listener()
     
     def disconnect_from_room(self, websocket: WebSocket, room_id: int):
         """Disconnect a user from a specific room"""
         if room_id in self.room_connections:
-            self.room_connections[room_id].remove(websocket)
+            self.room_connections[room_id].discard(websocket)
             if not self.room_connections[room_id]:
                 del self.room_connections[room_id]
     
     async def send_personal_message(self, message: str, user_id: int):
         """Send a personal message to a specific user"""
         if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
+            dead_connections = []
+            for connection in list(self.active_connections[user_id]):
                 try:
                     await connection.send_text(message)
                 except:
-                    # Remove dead connections
-                    self.active_connections[user_id].remove(connection)
+                    dead_connections.append(connection)
+            
+            # Remove dead connections once the sends are done
+            connections = self.active_connections.get(user_id)
+            if connections is not None:
+                connections.difference_update(dead_connections)
+                if not connections:
+                    del self.active_connections[user_id]
+    
+    @staticmethod
+    def encode_event(payload: Dict[str, Any]) -> str:
+        """Serialize a WebSocket event once, for every recipient and worker"""
+        return _event_encoder.encode(payload).decode("utf-8")
     
     async def broadcast_to_room(self, message: str, room_id: int):
-        """Broadcast a message to all users in a room"""
+        """Broadcast an already-serialized message to all users in a room, on every worker"""
+        if ChatService.uses_pg_notify():
+            payload = f"f:{room_id}:{message}"
+            if len(payload.encode("utf-8")) > PG_NOTIFY_MAX_PAYLOAD:
+                # Not a stored message, so there is no id for listeners to load it by
+                print(f"Warning: dropping a {len(payload)}-character frame for room {room_id}, too large for NOTIFY")
+                return
+            try:
+                self._ensure_room_listener()
+                await asyncio.to_thread(ChatService._pg_notify, payload)
+                return
+            except Exception as e:
+                print(f"Warning: NOTIFY failed, broadcasting on this worker only: {e}")
+                await self._local_broadcast(message, room_id)
+                return
+        
+        client = get_redis()
+        if client is not None:
+            try:
+                # Each worker's room listener (including this one's) delivers it locally
+                await client.publish(f"{ROOM_CHANNEL_PREFIX}{room_id}", message)
+                return
+            except RedisError as e:
+                disable_redis(e)
+        
+        await self._local_broadcast(message, room_id)
+    
+    @staticmethod
+    def uses_pg_notify() -> bool:
+        """Whether room broadcasts go through Postgres LISTEN/NOTIFY instead of Redis"""
+        # Listening relies on psycopg2's notification polling
+        return engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+    
+    @staticmethod
+    def _pg_notify_payload(message: ChatMessage) -> str:
+        """NOTIFY payload for a new message: its frame, or just its id if that is too large"""
+        payload = f"f:{message.room_id}:{ChatService._message_event(message)}"
+        if len(payload.encode("utf-8")) > PG_NOTIFY_MAX_PAYLOAD:
+            payload = f"m:{message.room_id}:{message.id}"
+        return payload
+    
+    @staticmethod
+    def _pg_notify(payload: str, db: Optional[Session] = None):
+        """Notify every worker's listener; with a session, only once its transaction commits"""
+        statement = text("SELECT pg_notify(:channel, :payload)")
+        params = {"channel": PG_ROOM_CHANNEL, "payload": payload}
+        if db is not None:
+            db.execute(statement, params)
+            return
+        with engine.begin() as conn:
+            conn.execute(statement, params)
+    
+    def _ensure_room_listener(self):
+        """Start this worker's subscription to room broadcasts (Postgres or Redis), once"""
+        if self._room_listener is not None and not self._room_listener.done():
+            return
+        if ChatService.uses_pg_notify():
+            self._room_listener = asyncio.create_task(self._listen_for_room_notifications())
+        elif REDIS_AVAILABLE:
+            self._room_listener = asyncio.create_task(self._listen_for_room_broadcasts())
+    
+    async def _listen_for_room_broadcasts(self):
+        """Relay room broadcasts published by any worker to this worker's sockets.
+        
+        Resubscribes once Redis is usable again after an error, and exits when this
+        worker has no room sockets left (connect_to_room starts it again).
+        """
+        while self.room_connections:
+            client = get_redis()
+            if client is None:
+                # Backing off; broadcasts are delivered locally meanwhile
+                await asyncio.sleep(1)
+                continue
+            
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{ROOM_CHANNEL_PREFIX}*")
+                while self.room_connections:
+                    item = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if item is None:
+                        continue
+                    room_id = int(item["channel"][len(ROOM_CHANNEL_PREFIX):])
+                    if room_id in self.room_connections:
+                        await self._local_broadcast(item["data"], room_id)
+            except RedisError as e:
+                disable_redis(e)
+            finally:
+                await pubsub.close()
+    
+    @staticmethod
+    def _connect_pg_listener():
+        """Open a dedicated (unpooled) psycopg2 connection listening on PG_ROOM_CHANNEL"""
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        conn = engine.dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        conn.cursor().execute(f"LISTEN {PG_ROOM_CHANNEL}")
+        return conn
+    
+    async def _listen_for_room_notifications(self):
+        """Relay room broadcasts notified by any worker to this worker's sockets.
+        
+        Reconnects after an error, and exits when this worker has no room sockets left
+        (connect_to_room starts it again).
+        """
+        loop = asyncio.get_running_loop()
+        while self.room_connections:
+            try:
+                conn = await asyncio.to_thread(ChatService._connect_pg_listener)
+            except Exception as e:
+                print(f"Warning: chat notification listener could not connect: {e}")
+                await asyncio.sleep(1)
+                continue
+            
+            # Wake up when the connection's socket is readable instead of polling it
+            readable = asyncio.Event()
+            loop.add_reader(conn.fileno(), readable.set)
+            try:
+                while self.room_connections:
+                    try:
+                        await asyncio.wait_for(readable.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        continue
+                    readable.clear()
+                    conn.poll()
+                    while conn.notifies:
+                        await self._relay_notification(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Warning: chat notification listener failed, reconnecting: {e}")
+            finally:
+                loop.remove_reader(conn.fileno())
+                conn.close()
+    
+    async def _relay_notification(self, payload: str):
+        """Deliver one PG_ROOM_CHANNEL notification to this worker's sockets in its room"""
+        kind, room_id, body = payload.split(":", 2)
+        room_id = int(room_id)
+        if room_id not in self.room_connections:
+            return
+        if kind == "m":
+            body = await asyncio.to_thread(ChatService._load_message_event, int(body))
+            if body is None:
+                return
+        await self._local_broadcast(body, room_id)
+    
+    @staticmethod
+    def _load_message_event(message_id: int) -> Optional[str]:
+        """Build a message's broadcast frame from the database (blocking)"""
+        db = SessionLocal()
+        try:
+            row = db.query(ChatMessage, User.username).outerjoin(
+                User, User.id == ChatMessage.user_id
+            ).filter(and_(ChatMessage.id == message_id, ChatMessage.is_deleted == False)).first()
+            if row is None:
+                return None
+            message = ChatService._attach_usernames([row])[0]
+            return ChatService._message_event(message)
+        finally:
+            db.close()
+    
+    async def _local_broadcast(self, message: str, room_id: int):
+        """Send a message to the room's sockets connected to this worker"""
         if room_id in self.room_connections:
+            # Snapshot, since connections can join or leave while sends are awaited
+            connections = list(self.room_connections[room_id])
             dead_connections = []
-            for connection in self.room_connections[room_id]:
-                try:
-                    await connection.send_text(message)
-                except:
-                    dead_connections.append(connection)
+            
+            # Send concurrently in batches so one slow client doesn't hold up the rest,
+            # yielding between batches to keep the event loop responsive
+            for start in range(0, len(connections), BROADCAST_BATCH_SIZE):
+                batch = connections[start:start + BROADCAST_BATCH_SIZE]
+                results = await asyncio.gather(
+                    *(connection.send_text(message) for connection in batch),
+                    return_exceptions=True
+                )
+                for connection, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        dead_connections.append(connection)
+                await asyncio.sleep(0)
             
             # Remove dead connections
-            for dead_connection in dead_connections:
-                self.room_connections[room_id].remove(dead_connection)
+            connections = self.room_connections.get(room_id)
+            if connections is not None:
+                connections.difference_update(dead_connections)
+                if not connections:
+                    del self.room_connections[room_id]
+    
+    def mark_read(self, user_id: int, room_id: int):
+        """Record that a user has read a room; saved with the next batched flush"""
+        self._pending_reads[(user_id, room_id)] = datetime.now()
+        if self._read_flusher is None or self._read_flusher.done():
+            self._read_flusher = asyncio.create_task(self._flush_reads_periodically())
+    
+    async def _flush_reads_periodically(self):
+        """Write pending read times every READ_FLUSH_INTERVAL seconds until none are left"""
+        while self._pending_reads:
+            await asyncio.sleep(READ_FLUSH_INTERVAL)
+            pending, self._pending_reads = self._pending_reads, {}
+            await asyncio.to_thread(self._write_reads, pending)
+    
+    @staticmethod
+    def _write_reads(pending: Dict[Tuple[int, int], datetime]):
+        """Update last_read_at for every pending (user, room) in one executemany"""
+        if not pending:
+            return
+        
+        participants = ChatParticipant.__table__
+        stmt = update(participants).where(
+            and_(
+                participants.c.user_id == bindparam('p_user_id'),
+                participants.c.room_id == bindparam('p_room_id')
+            )
+        ).values(last_read_at=bindparam('p_last_read_at'))
+        
+        db = SessionLocal()
+        try:
+            db.execute(stmt, [
+                {'p_user_id': user_id, 'p_room_id': room_id, 'p_last_read_at': read_at}
+                for (user_id, room_id), read_at in pending.items()
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Failed to save chat read times: {e}")
+        finally:
+            db.close()
+    
+    async def schedule_popular_topics_refresh(self):
+        """Refresh mv_popular_topics in the background at most once per interval, across workers"""
+        # SET NX: of the workers that find the view stale, only one refreshes it
+        if not await cache_add("chat:popular_topics:fresh", "1", POPULAR_TOPICS_REFRESH_INTERVAL):
+            return
+        if self._topics_refresher is None or self._topics_refresher.done():
+            self._topics_refresher = asyncio.create_task(asyncio.to_thread(self._refresh_popular_topics))
+    
+    @staticmethod
+    def _refresh_popular_topics():
+        """Recompute the popular topics view without blocking its readers"""
+        db = SessionLocal()
+        try:
+            db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_popular_topics"))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Failed to refresh popular topics: {e}")
+        finally:
+            db.close()
     
     @staticmethod
     async def create_chat_room(db: Session, user_id: int, room_data: ChatRoomCreate) -> ChatRoom:
@@ -90,6 +379,7 @@ class ChatService:
         
         room = ChatRoom(
             created_by=user_id,
+            active_participant_count=1,
             **room_data.dict()
         )
         
@@ -125,20 +415,28 @@ class ChatService:
             and_(ChatParticipant.user_id == user_id, ChatParticipant.room_id == room_id)
         ).first()
         
-        if existing_participant:
-            if not existing_participant.is_active:
-                existing_participant.is_active = True
-                db.commit()
+        if existing_participant and existing_participant.is_active:
             return existing_participant
         
-        # Check room capacity
-        participant_count = db.query(ChatParticipant).filter(
-            and_(ChatParticipant.room_id == room_id, ChatParticipant.is_active == True)
-        ).count()
+        # Claim a seat with a single conditional UPDATE; concurrent joins can't overfill the room
+        claimed = db.execute(
+            update(ChatRoom).where(
+                and_(
+                    ChatRoom.id == room_id,
+                    ChatRoom.active_participant_count < ChatRoom.max_participants
+                )
+            ).values(active_participant_count=ChatRoom.active_participant_count + 1)
+        ).rowcount
         
-        if participant_count >= room.max_participants:
+        if not claimed:
+            db.rollback()
             raise ValueError("Room is at maximum capacity")
         
+        if existing_participant:
+            existing_participant.is_active = True
+            db.commit()
+            return existing_participant
+        
         # Add participant
         participant = ChatParticipant(
             user_id=user_id,
@@ -160,75 +458,218 @@ class ChatService:
             and_(ChatParticipant.user_id == user_id, ChatParticipant.room_id == room_id)
         ).first()
         
-        if participant:
+        if participant and participant.is_active:
             participant.is_active = False
+            db.execute(
+                update(ChatRoom).where(
+                    and_(ChatRoom.id == room_id, ChatRoom.active_participant_count > 0)
+                ).values(active_participant_count=ChatRoom.active_participant_count - 1)
+            )
             db.commit()
     
     @staticmethod
     async def send_message(db: Session, user_id: int, message_data: ChatMessageCreate) -> ChatMessage:
-        """Send a message to a chat room"""
+        """Send a message to a chat room and broadcast it to the room's sockets"""
+        
+        # The session is synchronous; run its round trips in a worker thread so the
+        # event loop keeps serving WebSocket broadcasts meanwhile
+        notify = ChatService.uses_pg_notify()
+        message = await asyncio.to_thread(ChatService._insert_message, db, user_id, message_data, notify)
+        
+        if notify:
+            # Already notified by the insert's transaction; listen for it on this worker too
+            chat_service._ensure_room_listener()
+        else:
+            await chat_service.broadcast_to_room(ChatService._message_event(message), message.room_id)
+        
+        await ChatService._push_recent_message(message)
+        
+        # Update last read time for sender
+        chat_service.mark_read(user_id, message_data.room_id)
+        
+        return message
+    
+    @staticmethod
+    def _insert_message(db: Session, user_id: int, message_data: ChatMessageCreate, notify: bool = False) -> ChatMessage:
+        """Check membership and save a message (blocking; called from send_message).
+        
+        With notify, the room NOTIFY is sent in the same transaction, so it is delivered
+        if and only if the message is committed.
+        """
         
         # Check if user is a participant in the room
-        participant = db.query(ChatParticipant).filter(
+        is_participant = db.query(exists().where(
             and_(
                 ChatParticipant.user_id == user_id,
                 ChatParticipant.room_id == message_data.room_id,
                 ChatParticipant.is_active == True
             )
-        ).first()
+        )).scalar()
         
-        if not participant:
+        if not is_participant:
             raise ValueError("You are not a participant in this room")
         
         # Create message
+        # The schema has its own MessageType; the column only accepts the model's
+        fields = message_data.dict()
+        fields["message_type"] = MessageType(fields["message_type"].value)
         message = ChatMessage(
             user_id=user_id,
-            **message_data.dict()
+            **fields
         )
         
         db.add(message)
+        if notify:
+            # Flush and reload first, so the frame has the id and server-set created_at
+            db.flush()
+            db.refresh(message)
+            message.username = message.user.username if message.user else None
+            ChatService._pg_notify(ChatService._pg_notify_payload(message), db)
         db.commit()
         db.refresh(message)
-        
-        # Update last read time for sender
-        participant.last_read_at = datetime.now()
-        db.commit()
+        message.username = message.user.username if message.user else None
         
         return message
     
+    @staticmethod
+    def _message_payload(message: ChatMessage) -> Dict[str, Any]:
+        """A message (with username) as sent to clients"""
+        payload = ChatMessageSchema.model_validate(message).model_dump()
+        payload["username"] = getattr(message, "username", None)
+        return payload
+    
+    @staticmethod
+    def _recent_message_entry(message: ChatMessage) -> str:
+        """Serialize a message as stored in the recent-messages list"""
+        return ChatService.encode_event(ChatService._message_payload(message))
+    
+    @staticmethod
+    def _message_event(message: ChatMessage) -> str:
+        """Serialize the WebSocket event announcing a new message"""
+        return ChatService.encode_event({
+            "type": "message",
+            "message": ChatService._message_payload(message),
+            "room_id": message.room_id
+        })
+    
+    @staticmethod
+    async def _push_recent_message(message: ChatMessage):
+        """Prepend a new message to its room's recent list, if that list is currently cached"""
+        client = get_redis()
+        if client is None:
+            return
+        key = f"{RECENT_MESSAGES_PREFIX}{message.room_id}"
+        try:
+            # LPUSHX only touches an existing list, so a partial list is never started here
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.lpushx(key, ChatService._recent_message_entry(message))
+                pipe.ltrim(key, 0, RECENT_MESSAGES_LIMIT - 1)
+                await pipe.execute()
+        except RedisError as e:
+            disable_redis(e)
+    
+    @staticmethod
+    async def forget_recent_messages(room_id: int):
+        """Drop a room's cached recent messages, e.g. after an edit or delete"""
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            await client.delete(f"{RECENT_MESSAGES_PREFIX}{room_id}")
+        except RedisError as e:
+            disable_redis(e)
+    
+    @staticmethod
+    async def _get_recent_messages(db: Session, room_id: int, offset: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Serve a page of the newest RECENT_MESSAGES_LIMIT messages from Redis, filling the list on a miss.
+        
+        Returns None when Redis is not available, so the caller queries the database as usual.
+        """
+        client = get_redis()
+        if client is None:
+            return None
+        key = f"{RECENT_MESSAGES_PREFIX}{room_id}"
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.exists(key)
+                pipe.lrange(key, offset, offset + limit - 1)
+                cached, entries = await pipe.execute()
+            
+            if not cached:
+                query = db.query(ChatMessage, User.username).outerjoin(
+                    User, User.id == ChatMessage.user_id
+                ).filter(
+                    and_(ChatMessage.room_id == room_id, ChatMessage.is_deleted == False)
+                ).order_by(desc(ChatMessage.created_at), desc(ChatMessage.id)).limit(RECENT_MESSAGES_LIMIT)
+                messages = ChatService._attach_usernames(await asyncio.to_thread(query.all))
+                all_entries = [ChatService._recent_message_entry(message) for message in messages]
+                if all_entries:
+                    async with client.pipeline(transaction=True) as pipe:
+                        pipe.delete(key)
+                        pipe.rpush(key, *all_entries)
+                        pipe.expire(key, RECENT_MESSAGES_TTL)
+                        await pipe.execute()
+                    
+                    # A message committed after the read above found no list to LPUSHX onto,
+                    # so the list just written would be missing it. If any arrived, drop the
+                    # list again (the next read refills it) and serve them from this read.
+                    newer = db.query(ChatMessage, User.username).outerjoin(
+                        User, User.id == ChatMessage.user_id
+                    ).filter(
+                        and_(
+                            ChatMessage.room_id == room_id,
+                            ChatMessage.is_deleted == False,
+                            ChatMessage.id > messages[0].id
+                        )
+                    ).order_by(desc(ChatMessage.created_at), desc(ChatMessage.id))
+                    newer_messages = ChatService._attach_usernames(await asyncio.to_thread(newer.all))
+                    if newer_messages:
+                        await client.delete(key)
+                        all_entries = [ChatService._recent_message_entry(message) for message in newer_messages] + all_entries
+                entries = all_entries[offset:offset + limit]
+        except RedisError as e:
+            disable_redis(e)
+            return None
+        
+        return [msgspec.json.decode(entry) for entry in entries]
+    
     @staticmethod
     async def get_room_messages(
         db: Session,
         room_id: int,
         limit: int = 50,
         offset: int = 0,
-        user_id: Optional[int] = None
+        user_id: Optional[int] = None,
+        before_created_at: Optional[datetime] = None,
+        before_id: Optional[int] = None
     ) -> List[ChatMessage]:
-        """Get messages from a chat room"""
-        
-        query = db.query(ChatMessage).filter(
+        """Get messages from a chat room, newest first.
+        
+        Offset pages within the newest RECENT_MESSAGES_LIMIT messages are served from Redis
+        as plain dicts; cursor pages and deeper offsets go to the database.
+        """
+        
+        if before_created_at is None and before_id is None and offset + limit <= RECENT_MESSAGES_LIMIT:
+            messages = await ChatService._get_recent_messages(db, room_id, offset, limit)
+            if messages is not None:
+                if user_id:
+                    chat_service.mark_read(user_id, room_id)
+                return messages
+        
+        # Usernames come back in the same query instead of one lookup per message
+        query = db.query(ChatMessage, User.username).outerjoin(
+            User, User.id == ChatMessage.user_id
+        ).filter(
             and_(ChatMessage.room_id == room_id, ChatMessage.is_deleted == False)
-        ).order_by(desc(ChatMessage.created_at))
-        
-        messages = query.offset(offset).limit(limit).all()
+        )
+        query = ChatService._page_messages(query, offset, limit, before_created_at, before_id)
         
-        # Add user information
-        for message in messages:
-            user = db.query(User).filter(User.id == message.user_id).first()
-            if user:
-                message.username = user.username
+        rows = await asyncio.to_thread(query.all)
+        messages = ChatService._attach_usernames(rows)
         
         # Update last read time for user
         if user_id:
-            participant = db.query(ChatParticipant).filter(
-                and_(
-                    ChatParticipant.user_id == user_id,
-                    ChatParticipant.room_id == room_id
-                )
-            ).first()
-            if participant:
-                participant.last_read_at = datetime.now()
-                db.commit()
+            chat_service.mark_read(user_id, room_id)
         
         return messages
     
@@ -287,21 +728,10 @@ class ChatService:
         
         group = StudyGroup(
             created_by=user_id,
+            member_count=1,
             **group_data.dict()
         )
         
-        db.add(group)
-        db.commit()
-        db.refresh(group)
-        
-        # Add creator as member
-        member = StudyGroupMember(
-            group_id=group.id,
-            user_id=user_id,
-            role="admin"
-        )
-        db.add(member)
-        
         # Create chat room for the group
         room = ChatRoom(
             name=f"Study Group: {group.name}",
@@ -309,19 +739,21 @@ class ChatService:
             room_type=ChatRoomType.STUDY_GROUP,
             topic=group.topic,
             created_by=user_id,
-            max_participants=group.max_members
+            max_participants=group.max_members,
+            active_participant_count=1
         )
-        db.add(room)
-        db.commit()
         
-        # Add creator to chat room
-        participant = ChatParticipant(
-            user_id=user_id,
-            room_id=room.id,
-            role="admin"
-        )
-        db.add(participant)
+        # One flush assigns both ids; everything is committed together
+        db.add_all([group, room])
+        db.flush()
+        
+        # Add creator as member and to the chat room
+        db.add_all([
+            StudyGroupMember(group_id=group.id, user_id=user_id, role="admin"),
+            ChatParticipant(user_id=user_id, room_id=room.id, role="admin")
+        ])
         db.commit()
+        db.refresh(group)
         
         return group
     
@@ -345,9 +777,15 @@ class ChatService:
         if existing_member:
             return existing_member
         
-        # Check group capacity
-        member_count = db.query(StudyGroupMember).filter(StudyGroupMember.group_id == group_id).count()
-        if member_count >= group.max_members:
+        # Claim a place with a single conditional UPDATE, as join_room does for seats
+        claimed = db.execute(
+            update(StudyGroup).where(
+                and_(StudyGroup.id == group_id, StudyGroup.member_count < StudyGroup.max_members)
+            ).values(member_count=StudyGroup.member_count + 1)
+        ).rowcount
+        
+        if not claimed:
+            db.rollback()
             raise ValueError("Study group is at maximum capacity")
         
         # Add member
@@ -366,7 +804,12 @@ class ChatService:
     async def get_user_rooms(db: Session, user_id: int) -> List[ChatRoom]:
         """Get all rooms a user is participating in"""
         
-        rooms = db.query(ChatRoom).join(ChatParticipant).filter(
+        counts = ChatService._participant_counts_subquery(db)
+        rows = db.query(ChatRoom, func.coalesce(counts.c.participant_count, 0)).join(
+            ChatParticipant
+        ).outerjoin(
+            counts, counts.c.room_id == ChatRoom.id
+        ).filter(
             and_(
                 ChatParticipant.user_id == user_id,
                 ChatParticipant.is_active == True,
@@ -374,19 +817,16 @@ class ChatService:
             )
         ).all()
         
-        # Add participant count
-        for room in rooms:
-            room.participant_count = db.query(ChatParticipant).filter(
-                and_(ChatParticipant.room_id == room.id, ChatParticipant.is_active == True)
-            ).count()
-        
-        return rooms
+        return ChatService._attach_participant_counts(rows)
     
     @staticmethod
     async def search_rooms(db: Session, search_data: ChatSearch) -> List[ChatRoom]:
         """Search for chat rooms"""
         
-        query = db.query(ChatRoom).filter(ChatRoom.is_active == True)
+        counts = ChatService._participant_counts_subquery(db)
+        query = db.query(ChatRoom, func.coalesce(counts.c.participant_count, 0)).outerjoin(
+            counts, counts.c.room_id == ChatRoom.id
+        ).filter(ChatRoom.is_active == True)
         
         if search_data.query:
             query = query.filter(
@@ -402,24 +842,39 @@ class ChatService:
         if search_data.topic:
             query = query.filter(ChatRoom.topic.ilike(f"%{search_data.topic}%"))
         
-        rooms = query.offset(search_data.offset).limit(search_data.limit).all()
-        
-        # Add participant count
-        for room in rooms:
-            room.participant_count = db.query(ChatParticipant).filter(
-                and_(ChatParticipant.room_id == room.id, ChatParticipant.is_active == True)
-            ).count()
+        rows = query.offset(search_data.offset).limit(search_data.limit).all()
         
+        return ChatService._attach_participant_counts(rows)
+    
+    @staticmethod
+    def _participant_counts_subquery(db: Session):
+        """Active participant count per room, grouped once for joining onto room queries"""
+        return db.query(
+            ChatParticipant.room_id,
+            func.count(ChatParticipant.id).label('participant_count')
+        ).filter(
+            ChatParticipant.is_active == True
+        ).group_by(ChatParticipant.room_id).subquery()
+    
+    @staticmethod
+    def _attach_participant_counts(rows) -> List[ChatRoom]:
+        """Set participant_count on each room from (room, count) rows"""
+        rooms = []
+        for room, participant_count in rows:
+            room.participant_count = participant_count
+            rooms.append(room)
         return rooms
     
     @staticmethod
     async def search_messages(db: Session, search_data: MessageSearch) -> List[ChatMessage]:
         """Search for messages"""
         
-        query = db.query(ChatMessage).filter(ChatMessage.is_deleted == False)
+        query = db.query(ChatMessage, User.username).outerjoin(
+            User, User.id == ChatMessage.user_id
+        ).filter(ChatMessage.is_deleted == False)
         
         if search_data.query:
-            query = query.filter(ChatMessage.content.ilike(f"%{search_data.query}%"))
+            query = query.filter(ChatService._message_text_filter(db, search_data.query))
         
         if search_data.message_type:
             query = query.filter(ChatMessage.message_type == search_data.message_type)
@@ -433,14 +888,68 @@ class ChatService:
         if search_data.end_date:
             query = query.filter(ChatMessage.created_at <= search_data.end_date)
         
-        messages = query.order_by(desc(ChatMessage.created_at)).offset(search_data.offset).limit(search_data.limit).all()
+        rows = ChatService._page_messages(
+            query, search_data.offset, search_data.limit,
+            search_data.before_created_at, search_data.before_id
+        ).all()
         
-        # Add user information
-        for message in messages:
-            user = db.query(User).filter(User.id == message.user_id).first()
-            if user:
-                message.username = user.username
+        return ChatService._attach_usernames(rows)
+    
+    @staticmethod
+    def _page_messages(query, offset: int, limit: int, before_created_at: Optional[datetime], before_id: Optional[int]):
+        """Order messages newest first and apply a page.
+        
+        With a cursor (the created_at and id of the last message already shown) this
+        seeks straight past it, so deep pages cost the same as the first; otherwise it
+        falls back to OFFSET.
+        """
+        created_at = ChatMessage.created_at
+        if query.session.get_bind().dialect.name == "sqlite":
+            # SQLite stores timestamps as text, and CURRENT_TIMESTAMP has no fraction while
+            # a bound datetime always does; compare both as datetime() so equal instants
+            # compare equal. Stored values are UTC.
+            created_at = func.datetime(ChatMessage.created_at)
+            if before_created_at is not None and before_created_at.tzinfo is not None:
+                before_created_at = before_created_at.astimezone(timezone.utc).replace(tzinfo=None)
+            cursor_created_at = func.datetime(before_created_at)
+        else:
+            cursor_created_at = before_created_at
+        
+        query = query.order_by(desc(created_at), desc(ChatMessage.id))
+        
+        if before_created_at is not None and before_id is not None:
+            query = query.filter(
+                or_(
+                    created_at < cursor_created_at,
+                    and_(created_at == cursor_created_at, ChatMessage.id < before_id)
+                )
+            )
+        elif offset:
+            query = query.offset(offset)
         
+        return query.limit(limit)
+    
+    @staticmethod
+    def _message_text_filter(db: Session, search_query: str):
+        """Match message content via the full-text index on Postgres, else by substring"""
+        if db.get_bind().dialect.name == "postgresql" and len(search_query.strip()) >= MIN_FULL_TEXT_QUERY_LENGTH:
+            # Must match the idx_chat_message_content_tsv expression (a literal config,
+            # not a bound parameter) for the planner to use the index
+            config = literal_column("'simple'")
+            return func.to_tsvector(config, ChatMessage.content).op('@@')(
+                func.plainto_tsquery(config, search_query)
+            )
+        
+        return ChatMessage.content.ilike(f"%{search_query}%")
+    
+    @staticmethod
+    def _attach_usernames(rows) -> List[ChatMessage]:
+        """Set username on each message from (message, username) rows"""
+        messages = []
+        for message, username in rows:
+            if username is not None:
+                message.username = username
+            messages.append(message)
         return messages
     
     @staticmethod
@@ -499,6 +1008,10 @@ class ChatService:
     async def get_chat_stats(db: Session) -> Dict[str, Any]:
         """Get chat statistics"""
         
+        cached = await cache_get("chat:stats:global")
+        if cached is not None:
+            return json.loads(cached)
+        
         total_messages = db.query(ChatMessage).filter(ChatMessage.is_deleted == False).count()
         total_rooms = db.query(ChatRoom).filter(ChatRoom.is_active == True).count()
         
@@ -515,25 +1028,48 @@ class ChatService:
         ).count()
         
         # Popular topics (rooms with most messages)
-        popular_topics = db.query(
-            ChatRoom.topic,
-            func.count(ChatMessage.id).label('message_count')
-        ).join(ChatMessage).filter(
-            and_(ChatRoom.topic.isnot(None), ChatMessage.is_deleted == False)
-        ).group_by(ChatRoom.topic).order_by(desc(text('message_count'))).limit(10).all()
-        
-        return {
+        popular_topics = None
+        if db.get_bind().dialect.name == "postgresql":
+            # Read the precomputed view; it lags by at most POPULAR_TOPICS_REFRESH_INTERVAL
+            try:
+                popular_topics = db.execute(text(
+                    "SELECT topic, message_count FROM mv_popular_topics "
+                    "ORDER BY message_count DESC LIMIT 10"
+                )).all()
+                await chat_service.schedule_popular_topics_refresh()
+            except Exception as e:
+                # The view is missing until upgrade_db has run on this database
+                db.rollback()
+                print(f"Warning: mv_popular_topics unavailable, counting topics live: {e}")
+        
+        if popular_topics is None:
+            popular_topics = db.query(
+                ChatRoom.topic,
+                func.count(ChatMessage.id).label('message_count')
+            ).join(ChatMessage).filter(
+                and_(ChatRoom.topic.isnot(None), ChatMessage.is_deleted == False)
+            ).group_by(ChatRoom.topic).order_by(desc(text('message_count'))).limit(10).all()
+        
+        stats = {
             "total_messages": total_messages,
             "total_rooms": total_rooms,
             "active_participants": active_participants,
             "messages_today": messages_today,
             "popular_topics": [{"topic": t.topic, "count": t.message_count} for t in popular_topics]
         }
+        
+        await cache_set("chat:stats:global", json.dumps(stats), CHAT_STATS_CACHE_TTL)
+        return stats
     
     @staticmethod
     async def get_room_stats(db: Session, room_id: int) -> Dict[str, Any]:
         """Get statistics for a specific room"""
         
+        cache_key = f"chat:stats:room:{room_id}"
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+        
         total_messages = db.query(ChatMessage).filter(
             and_(ChatMessage.room_id == room_id, ChatMessage.is_deleted == False)
         ).count()
@@ -548,12 +1084,15 @@ class ChatService:
             and_(ChatMessage.room_id == room_id, ChatMessage.created_at >= today)
         ).count()
         
-        return {
+        stats = {
             "room_id": room_id,
             "total_messages": total_messages,
             "active_participants": active_participants,
             "messages_today": messages_today
         }
+        
+        await cache_set(cache_key, json.dumps(stats), CHAT_STATS_CACHE_TTL)
+        return stats
 
 # Global chat service instance
 chat_service = ChatService() 
\ No newline at end of file
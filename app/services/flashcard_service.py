@@ -1,21 +1,32 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, and_, or_, insert, select
 from datetime import datetime, timedelta
 import uuid
-import statistics
 from app.models.flashcards import (
-    Flashcard, FlashcardReview, FlashcardDeck, StudySession,
+    Flashcard, FlashcardReview, FlashcardDeck, DeckFlashcard, StudySession,
     FlashcardStatus, FlashcardDifficulty
 )
 from app.models.quiz import Question, Quiz
 from app.models.user import User
+from app.core.cache import cache_get, cache_set, cache_delete
 from app.schemas.flashcards import (
     FlashcardCreate, FlashcardUpdate, FlashcardReviewCreate,
     FlashcardDeckCreate, StudySessionCreate, StudySessionUpdate,
     StudySessionResponse, StudyProgress, SpacedRepetitionSettings,
-    SpacedRepetitionResult, FlashcardStats, DeckStats
+    SpacedRepetitionResult, FlashcardStats, DeckStats,
+    FlashcardDeck as FlashcardDeckSchema, Flashcard as FlashcardSchema
 )
+from app.schemas.flashcards_fast import (
+    FlashcardFast, StudyCardFast, StudySessionResponseFast
+)
+
+# Scheduler settings are constant, so validate them once at import
+SPACED_REPETITION_SETTINGS = SpacedRepetitionSettings()
+
+# Seconds flashcard stats stay cached; card and review changes invalidate them sooner.
+# Also bounds how stale another worker's in-process copy can be without Redis.
+FLASHCARD_STATS_CACHE_TTL = 60
 
 class FlashcardService:
     
@@ -62,15 +73,96 @@ class FlashcardService:
             back_content=back_content,
             hint=hint,
             tags=tags,
+            topic=question.quiz.topic,
             status=FlashcardStatus.NEW
         )
         
         db.add(flashcard)
         db.commit()
         db.refresh(flashcard)
+        await FlashcardService.invalidate_stats(user_id)
         
         return flashcard
     
+    @staticmethod
+    async def bulk_create_from_questions(
+        db: Session,
+        user_id: int,
+        items: List[FlashcardCreate]
+    ) -> List[FlashcardSchema]:
+        """Create flashcards for many quiz questions with one SELECT per check and one INSERT.
+        
+        As in create_flashcard_from_question, a question the user already has a card for
+        yields that card rather than a new one. Returns one card per distinct question,
+        in request order.
+        """
+        overrides = {}
+        for item in items:
+            overrides.setdefault(item.question_id, item)
+        
+        cards = FlashcardService._cards_for_questions(db, user_id, list(overrides), overrides)
+        
+        # Serialize before commit expires the rows, which would reload them one by one
+        result = [FlashcardSchema.from_orm_fast(cards[question_id]) for question_id in overrides]
+        db.commit()
+        await FlashcardService.invalidate_stats(user_id)
+        
+        return result
+    
+    @staticmethod
+    def _cards_for_questions(
+        db: Session,
+        user_id: int,
+        question_ids: List[int],
+        overrides: Optional[Dict[int, FlashcardCreate]] = None
+    ) -> Dict[int, Flashcard]:
+        """Map each question id to the user's card for it, inserting missing cards in one
+        multi-row INSERT. Content not given in overrides comes from the question. Flushes
+        but does not commit.
+        """
+        overrides = overrides or {}
+        question_ids = set(question_ids)
+        
+        questions = {
+            question.id: (question, topic)
+            for question, topic in db.query(Question, Quiz.topic).join(Quiz).filter(Question.id.in_(question_ids))
+        }
+        missing = sorted(question_ids - questions.keys())
+        if missing:
+            raise ValueError(f"Questions not found: {missing}")
+        
+        cards = {
+            card.question_id: card
+            for card in db.query(Flashcard).filter(
+                and_(Flashcard.user_id == user_id, Flashcard.question_id.in_(question_ids))
+            )
+        }
+        
+        rows = []
+        for question_id in sorted(question_ids - cards.keys()):
+            question, topic = questions[question_id]
+            item = overrides.get(question_id)
+            rows.append({
+                "user_id": user_id,
+                "question_id": question_id,
+                "front_content": (item and item.front_content) or question.question_text,
+                "back_content": (item and item.back_content) or f"Answer: {question.correct_answer}\n\nExplanation: {question.explanation}",
+                "hint": item.hint if item else None,
+                "tags": list(item.tags) if item else [],
+                "topic": topic,
+                "status": FlashcardStatus.NEW
+            })
+        
+        if rows:
+            # One multi-row INSERT ... RETURNING; the returned rows carry server defaults
+            created = db.scalars(
+                insert(Flashcard).returning(Flashcard, sort_by_parameter_order=True),
+                rows
+            ).all()
+            cards.update((card.question_id, card) for card in created)
+        
+        return cards
+    
     @staticmethod
     async def create_flashcard_deck(
         db: Session,
@@ -96,8 +188,12 @@ class FlashcardService:
         user_id: int,
         deck_id: int,
         question_ids: List[int]
-    ) -> List[Flashcard]:
-        """Add questions to a deck as flashcards"""
+    ) -> List[FlashcardSchema]:
+        """Add questions to a deck as flashcards, creating the cards the user lacks.
+        
+        Cards and deck entries are each written with one multi-row INSERT; cards already
+        in the deck are not added twice.
+        """
         
         deck = db.query(FlashcardDeck).filter(
             and_(FlashcardDeck.id == deck_id, FlashcardDeck.user_id == user_id)
@@ -106,17 +202,33 @@ class FlashcardService:
         if not deck:
             raise ValueError("Deck not found")
         
-        flashcards = []
-        for question_id in question_ids:
-            flashcard = await FlashcardService.create_flashcard_from_question(
-                db, user_id, question_id
+        question_ids = list(dict.fromkeys(question_ids))
+        cards = FlashcardService._cards_for_questions(db, user_id, question_ids)
+        
+        card_ids = [cards[question_id].id for question_id in question_ids]
+        in_deck = set(db.scalars(
+            select(DeckFlashcard.flashcard_id).where(
+                DeckFlashcard.deck_id == deck_id, DeckFlashcard.flashcard_id.in_(card_ids)
             )
-            flashcards.append(flashcard)
+        ))
+        last_position = db.scalar(
+            select(func.coalesce(func.max(DeckFlashcard.position), 0)).where(DeckFlashcard.deck_id == deck_id)
+        )
+        new_ids = [card_id for card_id in card_ids if card_id not in in_deck]
+        if new_ids:
+            db.execute(insert(DeckFlashcard), [
+                {"deck_id": deck_id, "flashcard_id": card_id, "position": last_position + offset}
+                for offset, card_id in enumerate(new_ids, start=1)
+            ])
         
         # Update deck statistics
-        deck.total_cards = len(flashcards)
-        deck.learning_cards = len(flashcards)
+        deck.total_cards = (deck.total_cards or 0) + len(new_ids)
+        deck.learning_cards = (deck.learning_cards or 0) + len(new_ids)
+        
+        # Serialize before commit expires the rows, which would reload them one by one
+        flashcards = [FlashcardSchema.from_orm_fast(cards[question_id]) for question_id in question_ids]
         db.commit()
+        await FlashcardService.invalidate_stats(user_id)
         
         return flashcards
     
@@ -125,7 +237,7 @@ class FlashcardService:
         db: Session,
         user_id: int,
         session_data: StudySessionCreate
-    ) -> StudySessionResponse:
+    ) -> StudySessionResponseFast:
         """Start a new study session"""
         
         session_id = str(uuid.uuid4())
@@ -168,16 +280,16 @@ class FlashcardService:
             elif is_review:
                 total_review += 1
             
-            study_cards.append({
-                "flashcard": card,
-                "is_new": is_new,
-                "is_review": is_review,
-                "is_learning": is_learning,
-                "interval": card.interval,
-                "ease_factor": card.ease_factor
-            })
-        
-        return StudySessionResponse(
+            study_cards.append(StudyCardFast(
+                flashcard=FlashcardFast.from_orm(card),
+                is_new=is_new,
+                is_review=is_review,
+                is_learning=is_learning,
+                interval=card.interval,
+                ease_factor=card.ease_factor
+            ))
+        
+        return StudySessionResponseFast(
             session_id=session_id,
             cards=study_cards,
             total_new=total_new,
@@ -202,18 +314,25 @@ class FlashcardService:
         if not flashcard:
             raise ValueError("Flashcard not found")
         
-        # Create review record
+        # The request carries the schema enum; the model and scheduler use the model's
+        difficulty_rating = FlashcardDifficulty(review_data.difficulty_rating.value)
+        
+        # Create review record (the path's flashcard id, not the body's, is the one checked above)
         review = FlashcardReview(
             flashcard_id=flashcard_id,
             user_id=user_id,
-            **review_data.dict()
+            **review_data.dict(exclude={"flashcard_id", "difficulty_rating"}),
+            difficulty_rating=difficulty_rating
         )
         
         db.add(review)
         
+        # One timestamp for the whole review keeps last_reviewed and next_review consistent
+        reviewed_at = datetime.now()
+        
         # Update flashcard statistics
         flashcard.review_count += 1
-        flashcard.last_reviewed = datetime.now()
+        flashcard.last_reviewed = reviewed_at
         
         if review_data.was_correct:
             flashcard.correct_count += 1
@@ -222,16 +341,17 @@ class FlashcardService:
         
         # Apply spaced repetition algorithm
         result = await FlashcardService._apply_spaced_repetition(
-            flashcard, review_data.difficulty_rating
+            flashcard, difficulty_rating, reviewed_at
         )
         
         # Update flashcard with new values
         flashcard.interval = result.new_interval
         flashcard.ease_factor = result.new_ease_factor
         flashcard.next_review = result.next_review
-        flashcard.status = result.status
+        flashcard.status = FlashcardStatus(result.status.value)
         
         db.commit()
+        await FlashcardService.invalidate_stats(user_id)
         
         return result
     
@@ -270,37 +390,57 @@ class FlashcardService:
     async def get_flashcard_stats(db: Session, user_id: int) -> FlashcardStats:
         """Get comprehensive flashcard statistics"""
         
-        flashcards = db.query(Flashcard).filter(Flashcard.user_id == user_id).all()
-        
-        total_cards = len(flashcards)
-        new_cards = len([f for f in flashcards if f.status == FlashcardStatus.NEW])
-        learning_cards = len([f for f in flashcards if f.status == FlashcardStatus.LEARNING])
-        review_cards = len([f for f in flashcards if f.status == FlashcardStatus.REVIEWING])
-        mastered_cards = len([f for f in flashcards if f.status == FlashcardStatus.MASTERED])
-        
-        # Get review statistics
-        reviews = db.query(FlashcardReview).filter(FlashcardReview.user_id == user_id).all()
-        total_reviews = len(reviews)
-        correct_reviews = len([r for r in reviews if r.was_correct])
-        accuracy = correct_reviews / total_reviews if total_reviews > 0 else 0
-        
-        # Calculate average response time
-        response_times = [r.response_time for r in reviews if r.response_time]
-        average_response_time = statistics.mean(response_times) if response_times else 0
+        # Card creation, deletion and reviews drop this key via invalidate_stats
+        cache_key = f"fcstats:{user_id}"
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            return FlashcardStats.model_validate_json(cached)
         
-        # Calculate cards due today and tomorrow
-        today = datetime.now().date()
-        tomorrow = today + timedelta(days=1)
-        
-        cards_due_today = len([
-            f for f in flashcards 
-            if f.next_review and f.next_review.date() <= today
-        ])
-        
-        cards_due_tomorrow = len([
-            f for f in flashcards 
-            if f.next_review and f.next_review.date() == tomorrow
-        ])
+        stats = FlashcardService._build_flashcard_stats(db, user_id)
+        await cache_set(cache_key, stats.model_dump_json(), FLASHCARD_STATS_CACHE_TTL)
+        return stats
+    
+    @staticmethod
+    async def invalidate_stats(user_id: int):
+        """Drop the cached get_flashcard_stats result after the user's cards or reviews change"""
+        await cache_delete(f"fcstats:{user_id}")
+    
+    @staticmethod
+    def _build_flashcard_stats(db: Session, user_id: int) -> FlashcardStats:
+        """Compute get_flashcard_stats from the database"""
+        
+        # Cards are counted per status in one grouped query, the due counts alongside as
+        # filtered aggregates. A card is due today up to midnight, tomorrow in the day after
+        tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+        day_after = tomorrow + timedelta(days=1)
+        
+        status_counts = {}
+        cards_due_today = 0
+        cards_due_tomorrow = 0
+        for status, count, due_today, due_tomorrow in db.query(
+            Flashcard.status,
+            func.count(),
+            func.count().filter(Flashcard.next_review < tomorrow),
+            func.count().filter(and_(Flashcard.next_review >= tomorrow, Flashcard.next_review < day_after))
+        ).filter(Flashcard.user_id == user_id).group_by(Flashcard.status):
+            status_counts[status] = count
+            cards_due_today += due_today
+            cards_due_tomorrow += due_tomorrow
+        
+        total_cards = sum(status_counts.values())
+        new_cards = status_counts.get(FlashcardStatus.NEW, 0)
+        learning_cards = status_counts.get(FlashcardStatus.LEARNING, 0)
+        review_cards = status_counts.get(FlashcardStatus.REVIEWING, 0)
+        mastered_cards = status_counts.get(FlashcardStatus.MASTERED, 0)
+        
+        # Review totals; a response time of 0 counts as not recorded. The average is
+        # derived by the schema
+        total_reviews, correct_reviews, timed_reviews, total_response_time = db.query(
+            func.count(),
+            func.count().filter(FlashcardReview.was_correct),
+            func.count().filter(FlashcardReview.response_time != 0),
+            func.coalesce(func.sum(FlashcardReview.response_time), 0.0)
+        ).filter(FlashcardReview.user_id == user_id).one()
         
         return FlashcardStats(
             total_cards=total_cards,
@@ -310,8 +450,8 @@ class FlashcardService:
             mastered_cards=mastered_cards,
             total_reviews=total_reviews,
             correct_reviews=correct_reviews,
-            accuracy=accuracy,
-            average_response_time=average_response_time,
+            timed_reviews=timed_reviews,
+            total_response_time=total_response_time,
             cards_due_today=cards_due_today,
             cards_due_tomorrow=cards_due_tomorrow
         )
@@ -359,7 +499,7 @@ class FlashcardService:
         )
         
         return DeckStats(
-            deck=deck,
+            deck=FlashcardDeckSchema.from_orm_fast(deck),
             stats=stats,
             recent_performance=recent_performance,
             learning_curve=learning_curve
@@ -406,69 +546,67 @@ class FlashcardService:
     @staticmethod
     async def _apply_spaced_repetition(
         flashcard: Flashcard,
-        difficulty_rating: FlashcardDifficulty
+        difficulty_rating: FlashcardDifficulty,
+        reviewed_at: datetime
     ) -> SpacedRepetitionResult:
         """Apply spaced repetition algorithm (SuperMemo 2)"""
         
-        settings = SpacedRepetitionSettings()
+        new_interval, new_ease_factor, status = FlashcardService._schedule_review(
+            flashcard.interval, flashcard.ease_factor, difficulty_rating
+        )
+        
+        # Calculate next review date
+        next_review = reviewed_at + timedelta(days=new_interval)
+        
+        return SpacedRepetitionResult(
+            new_interval=new_interval,
+            new_ease_factor=new_ease_factor,
+            next_review=next_review,
+            status=status
+        )
+    
+    @staticmethod
+    def _schedule_review(
+        interval: int,
+        ease_factor: float,
+        difficulty_rating: FlashcardDifficulty
+    ) -> Tuple[int, float, FlashcardStatus]:
+        """Compute the next interval, ease factor and status for one review"""
+        
+        settings = SPACED_REPETITION_SETTINGS
         
         if difficulty_rating == FlashcardDifficulty.AGAIN:
             # Reset to learning phase
             new_interval = 0
-            new_ease_factor = max(
-                settings.minimum_ease_factor,
-                flashcard.ease_factor - 0.2
-            )
+            new_ease_factor = max(settings.minimum_ease_factor, ease_factor - 0.2)
             status = FlashcardStatus.LEARNING
             
         elif difficulty_rating == FlashcardDifficulty.HARD:
             # Reduce interval and ease factor
-            new_interval = max(1, int(flashcard.interval * 0.8))
-            new_ease_factor = max(
-                settings.minimum_ease_factor,
-                flashcard.ease_factor - 0.15
-            )
+            new_interval = max(1, int(interval * 0.8))
+            new_ease_factor = max(settings.minimum_ease_factor, ease_factor - 0.15)
             status = FlashcardStatus.REVIEWING
             
         elif difficulty_rating == FlashcardDifficulty.GOOD:
             # Standard interval increase
-            if flashcard.interval == 0:
-                new_interval = 1
-            else:
-                new_interval = int(flashcard.interval * flashcard.ease_factor)
-            
-            new_ease_factor = flashcard.ease_factor
+            new_interval = 1 if interval == 0 else int(interval * ease_factor)
+            new_ease_factor = ease_factor
             status = FlashcardStatus.REVIEWING
             
         else:  # EASY
             # Larger interval increase and ease factor bonus
-            if flashcard.interval == 0:
-                new_interval = 4
-            else:
-                new_interval = int(flashcard.interval * flashcard.ease_factor * 1.3)
-            
-            new_ease_factor = min(
-                5.0,
-                flashcard.ease_factor + settings.ease_bonus
-            )
+            new_interval = 4 if interval == 0 else int(interval * ease_factor * 1.3)
+            new_ease_factor = min(5.0, ease_factor + settings.ease_bonus)
             status = FlashcardStatus.REVIEWING
         
         # Cap interval at maximum
         new_interval = min(new_interval, settings.maximum_interval)
         
-        # Calculate next review date
-        next_review = datetime.now() + timedelta(days=new_interval)
-        
         # Update status based on interval
         if new_interval >= 30:  # Consider mastered after 30 days
             status = FlashcardStatus.MASTERED
         
-        return SpacedRepetitionResult(
-            new_interval=new_interval,
-            new_ease_factor=new_ease_factor,
-            next_review=next_review,
-            status=status
-        )
+        return new_interval, new_ease_factor, status
     
     @staticmethod
     async def _calculate_deck_stats(db: Session, flashcards: List[Flashcard]) -> FlashcardStats:
@@ -488,10 +626,8 @@ class FlashcardService:
         
         total_reviews = len(reviews)
         correct_reviews = len([r for r in reviews if r.was_correct])
-        accuracy = correct_reviews / total_reviews if total_reviews > 0 else 0
         
         response_times = [r.response_time for r in reviews if r.response_time]
-        average_response_time = statistics.mean(response_times) if response_times else 0
         
         # Calculate due cards
         today = datetime.now().date()
@@ -515,8 +651,8 @@ class FlashcardService:
             mastered_cards=mastered_cards,
             total_reviews=total_reviews,
             correct_reviews=correct_reviews,
-            accuracy=accuracy,
-            average_response_time=average_response_time,
+            timed_reviews=len(response_times),
+            total_response_time=sum(response_times),
             cards_due_today=cards_due_today,
             cards_due_tomorrow=cards_due_tomorrow
         )
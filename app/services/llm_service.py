@@ -8,6 +8,7 @@ from asyncio_throttle import Throttler
 
 from app.core.config import settings
 from app.schemas.quiz import QuizConfig, QuestionSchema
+from app.services.semantic_cache import semantic_reply_cache
 
 # Import LLM clients
 try:
@@ -749,6 +750,11 @@ class MultiLLMService:
         if not self.chatbot_providers:
             raise Exception("No LLM providers configured for chatbot")
         
+        # Reuse the reply to a near-identical earlier question in the same context
+        cached_response, embedding = await semantic_reply_cache.get(message, context)
+        if cached_response is not None:
+            return cached_response
+        
         # Try providers in order with fallback
         for provider in self.chatbot_providers:
             try:
@@ -757,6 +763,7 @@ class MultiLLMService:
                 response_time = time.time() - start_time
                 
                 print(f"Chat response from {provider.name} in {response_time:.2f}s")
+                await semantic_reply_cache.put(context, embedding, response)
                 return response
                 
             except Exception as e:
@@ -583,7 +583,7 @@ class PDFExportService:
         
         # Get recent quizzes
         recent_quizzes = db.query(QuizHistory).filter(
-            QuizHistory.user_id == user_id
+            and_(QuizHistory.user_id == user_id, QuizHistory.completed_at.isnot(None))
         ).order_by(desc(QuizHistory.completed_at)).limit(10).all()
         
         # Get weak areas
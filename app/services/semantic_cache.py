@@ -0,0 +1,123 @@
+"""
+Semantic cache for AI tutor chat replies.
+
+Tutor questions repeat a lot with different wording ("what is a closure?" /
+"explain closures"). Each message is embedded with a small sentence-transformers
+model, and a new message whose embedding is close enough to a cached one (same
+context) reuses that reply instead of calling an LLM provider.
+
+sentence-transformers is optional and not in requirements.txt (it pulls in
+torch): without it the cache is disabled and every message goes to the providers
+as before. The model is loaded at startup (see load); until it is ready, messages
+skip the cache. After a load or embedding error the cache is skipped for
+MODEL_RETRY_INTERVAL seconds, then the failed step is tried again.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Cosine similarity above which a cached reply is reused
+SIMILARITY_THRESHOLD = 0.92
+
+# Replies kept per context, oldest evicted first
+MAX_ENTRIES_PER_CONTEXT = 500
+MAX_CONTEXTS = 200
+
+# Seconds to skip the cache after a model error before loading or embedding again
+MODEL_RETRY_INTERVAL = 300
+
+class SemanticReplyCache:
+    """In-process nearest-neighbour cache of (message embedding, reply) per context"""
+
+    def __init__(self):
+        self._model = None
+        self._failed_at: Optional[float] = None
+        self._load_task: Optional[asyncio.Task] = None
+        # context -> (normalized embeddings matrix, replies)
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, List[str]]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return SENTENCE_TRANSFORMERS_AVAILABLE and self._model is not None and not self._backing_off()
+
+    def _backing_off(self) -> bool:
+        return self._failed_at is not None and time.monotonic() - self._failed_at < MODEL_RETRY_INTERVAL
+
+    def _back_off(self, error: Exception):
+        """Skip the cache for MODEL_RETRY_INTERVAL seconds after a model error; chat falls through to the providers"""
+        self._failed_at = time.monotonic()
+        print(f"Warning: Semantic reply cache unavailable for {MODEL_RETRY_INTERVAL}s: {error}")
+
+    def load(self):
+        """Load the embedding model (blocking; run in a worker thread, see start_loading)"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE or self._model is not None or self._backing_off():
+            return
+        try:
+            self._model = SentenceTransformer(EMBEDDING_MODEL)
+        except Exception as e:
+            self._back_off(e)
+
+    def start_loading(self):
+        """Load the model in a worker thread unless it is loaded or a load is running"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE or self._model is not None or self._backing_off():
+            return
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(asyncio.to_thread(self.load))
+
+    def _embed(self, message: str) -> "np.ndarray":
+        """Embed a message as a unit vector (runs in a worker thread)"""
+        return self._model.encode(message, normalize_embeddings=True).astype(np.float32)
+
+    async def get(self, message: str, context: Optional[str]) -> Tuple[Optional[str], Optional["np.ndarray"]]:
+        """Return (cached reply or None, message embedding for a later put)"""
+        if not self.enabled:
+            # A load that failed at startup is retried once its back-off is over;
+            # this message goes to the providers meanwhile
+            self.start_loading()
+            return None, None
+
+        try:
+            embedding = await asyncio.to_thread(self._embed, message)
+        except Exception as e:
+            self._back_off(e)
+            return None, None
+        entry = self._entries.get(context or "")
+        if entry is not None:
+            embeddings, replies = entry
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            similarities = embeddings @ embedding
+            best = int(similarities.argmax())
+            if similarities[best] >= SIMILARITY_THRESHOLD:
+                return replies[best], embedding
+
+        return None, embedding
+
+    async def put(self, context: Optional[str], embedding: Optional["np.ndarray"], reply: str):
+        """Cache a provider reply under the embedding returned by get"""
+        if embedding is None:
+            return
+
+        key = context or ""
+        async with self._lock:
+            embeddings, replies = self._entries.pop(key, (np.empty((0, embedding.shape[0]), dtype=np.float32), []))
+            embeddings = np.vstack([embeddings, embedding])[-MAX_ENTRIES_PER_CONTEXT:]
+            replies = (replies + [reply])[-MAX_ENTRIES_PER_CONTEXT:]
+            self._entries[key] = (embeddings, replies)
+
+            while len(self._entries) > MAX_CONTEXTS:
+                self._entries.popitem(last=False)
+
+# Global instance
+semantic_reply_cache = SemanticReplyCache()
@@ -3,9 +3,120 @@
 Database initialization script for Quizlet AI
 """
 
-from sqlalchemy import text
+from sqlalchemy import text, inspect, Enum
+from sqlalchemy.dialects.postgresql import JSONB, ENUM
 from app.core.database import engine, Base
 from app.models import *  # Import all models
+from app.models.chat import MESSAGE_SEARCH_INDEX_DDL, POPULAR_TOPICS_VIEW_DDL
+from app.models.flashcards import FLASHCARD_TAGS_INDEX_DDL, FLASHCARD_SEARCH_INDEX_DDL
+
+# Rows that would violate a unique index added after the table existed, removed first
+# so the index can be built. Keeps the newest row, as the upserts writing them would.
+DUPLICATE_CLEANUPS = {
+    "user_answers": """
+    DELETE FROM user_answers WHERE id NOT IN (
+        SELECT MAX(id) FROM user_answers GROUP BY user_id, quiz_id, question_id
+    )
+    """,
+}
+
+# Stored counters added after their tables existed, filled from the rows they count.
+# Only NULL counters are touched, so re-running is a no-op.
+COUNTER_BACKFILLS = [
+    """
+    UPDATE chat_rooms SET active_participant_count = (
+        SELECT COUNT(*) FROM chat_participants p
+        WHERE p.room_id = chat_rooms.id AND p.is_active
+    ) WHERE active_participant_count IS NULL
+    """,
+    """
+    UPDATE study_groups SET member_count = (
+        SELECT COUNT(*) FROM study_group_members m
+        WHERE m.group_id = study_groups.id
+    ) WHERE member_count IS NULL
+    """,
+]
+
+def upgrade_db():
+    """Bring tables created by an older release up to the current models.
+    
+    create_all never alters an existing table, so columns and indexes added to a model
+    since the table was created are added here. Safe to run on every deploy.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                # Added as plain nullable columns; constraints only apply to newly created tables
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"   + {table.name}.{column.name}")
+            
+            if table.name in DUPLICATE_CLEANUPS:
+                conn.execute(text(DUPLICATE_CLEANUPS[table.name]))
+            
+            for index in table.indexes:
+                if not index.unique:
+                    index.create(conn, checkfirst=True)
+                    continue
+                # Other existing duplicates would fail the build; report them and carry on
+                try:
+                    with conn.begin_nested():
+                        index.create(conn, checkfirst=True)
+                except Exception as e:
+                    print(f"   ! {index.name} not created: {e}")
+        
+        # Enum columns moved off native Postgres enum types are stored as their names in
+        # VARCHAR; the old types are dropped once no column uses them
+        if engine.dialect.name == "postgresql":
+            dropped_types = set()
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing_types = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    existing_type = existing_types.get(column.name)
+                    if isinstance(column.type, Enum) and not column.type.native_enum and isinstance(existing_type, ENUM):
+                        column_type = column.type.compile(dialect=engine.dialect)
+                        conn.execute(text(
+                            f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE {column_type} USING {column.name}::text"
+                        ))
+                        dropped_types.add(existing_type.name)
+                        print(f"   ~ {table.name}.{column.name} -> {column_type}")
+            for type_name in dropped_types:
+                conn.execute(text(f"DROP TYPE IF EXISTS {type_name}"))
+        
+        for statement in COUNTER_BACKFILLS:
+            conn.execute(text(statement))
+        
+        # Postgres objects create_all only makes alongside a new chat_messages table
+        if engine.dialect.name == "postgresql" and ChatMessage.__tablename__ in existing_tables:
+            for ddl in (MESSAGE_SEARCH_INDEX_DDL, POPULAR_TOPICS_VIEW_DDL):
+                conn.execute(ddl.against(ChatMessage.__table__))
+        
+        # flashcards.tags was created as json; the tag filter and its GIN index need jsonb
+        if engine.dialect.name == "postgresql" and Flashcard.__tablename__ in existing_tables:
+            tags_column = next(c for c in inspector.get_columns(Flashcard.__tablename__) if c["name"] == "tags")
+            if not isinstance(tags_column["type"], JSONB):
+                conn.execute(text("ALTER TABLE flashcards ALTER COLUMN tags TYPE jsonb USING tags::jsonb"))
+                print("   ~ flashcards.tags -> jsonb")
+            for ddl in (FLASHCARD_TAGS_INDEX_DDL, FLASHCARD_SEARCH_INDEX_DDL):
+                conn.execute(ddl.against(Flashcard.__table__))
+        
+        # quiz_history.weak_areas_identified was created as json; the weak area count unnests it as jsonb
+        if engine.dialect.name == "postgresql" and QuizHistory.__tablename__ in existing_tables:
+            weak_areas_column = next(c for c in inspector.get_columns(QuizHistory.__tablename__) if c["name"] == "weak_areas_identified")
+            if not isinstance(weak_areas_column["type"], JSONB):
+                conn.execute(text("ALTER TABLE quiz_history ALTER COLUMN weak_areas_identified TYPE jsonb USING weak_areas_identified::jsonb"))
+                print("   ~ quiz_history.weak_areas_identified -> jsonb")
 
 def init_db():
     """Initialize the database by creating all tables"""
@@ -14,6 +125,7 @@ def init_db():
     try:
         # Create all tables
         Base.metadata.create_all(bind=engine)
+        upgrade_db()
         
         print("✅ Database tables created successfully!")
         print("📊 Tables created:")
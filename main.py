@@ -6,6 +6,7 @@ from app.api.routes import auth, quiz, user, analytics, flashcards, chat, tenant
 # Temporarily disable export routes due to PDF dependency issues
 # from app.api.routes import export
 from app.core.config import settings
+from app.services.semantic_cache import semantic_reply_cache
 import os
 
 app = FastAPI(
@@ -42,6 +43,11 @@ app.include_router(flashcards.router, prefix="/api/flashcards", tags=["Flashcard
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(tenants.router, prefix="/api/tenants", tags=["Tenants"])
 
+@app.on_event("startup")
+async def load_semantic_cache_model():
+    """Load the chat reply cache's embedding model off the event loop so no request pays for it"""
+    semantic_reply_cache.start_loading()
+
 # Mount static files for frontend
 try:
     if os.path.exists("static"):
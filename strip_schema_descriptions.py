@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Strip Field(description=...) arguments from the pydantic schemas for production builds.
+
+Descriptions only feed the OpenAPI docs, but every one is kept alive in each
+worker's core schemas. Run as part of the build; it is a no-op unless
+ENVIRONMENT=production (or --force is passed).
+"""
+
+import ast
+import os
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+SCHEMAS_DIR = Path(__file__).parent / "app" / "schemas"
+
+def _offset(line_starts: List[int], lineno: int, col: int) -> int:
+    return line_starts[lineno - 1] + col
+
+def _is_field_call(node: ast.Call) -> bool:
+    func = node.func
+    return (isinstance(func, ast.Name) and func.id == "Field") or (
+        isinstance(func, ast.Attribute) and func.attr == "Field"
+    )
+
+def strip_descriptions(source: str) -> Tuple[str, int]:
+    """Return source with description= removed from Field() calls, and the count removed"""
+    tree = ast.parse(source)
+    encoded = source.encode("utf-8")
+    line_starts = [0]
+    for line in encoded.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    spans = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not _is_field_call(node):
+            continue
+
+        arguments = sorted(node.args + node.keywords, key=lambda n: (n.lineno, n.col_offset))
+        for index, argument in enumerate(arguments):
+            if not isinstance(argument, ast.keyword) or argument.arg != "description":
+                continue
+
+            end = _offset(line_starts, argument.end_lineno, argument.end_col_offset)
+            if index > 0:
+                # Remove from the end of the previous argument, taking its comma
+                previous = arguments[index - 1]
+                start = _offset(line_starts, previous.end_lineno, previous.end_col_offset)
+            else:
+                start = _offset(line_starts, argument.lineno, argument.col_offset)
+                if index + 1 < len(arguments):
+                    following = arguments[index + 1]
+                    end = _offset(line_starts, following.lineno, following.col_offset)
+            spans.append((start, end))
+
+    for start, end in sorted(spans, reverse=True):
+        encoded = encoded[:start] + encoded[end:]
+
+    return encoded.decode("utf-8"), len(spans)
+
+def main() -> int:
+    if os.getenv("ENVIRONMENT") != "production" and "--force" not in sys.argv:
+        print("ℹ️  ENVIRONMENT is not production - leaving schema descriptions in place")
+        return 0
+
+    total = 0
+    for path in sorted(SCHEMAS_DIR.glob("*.py")):
+        source = path.read_text(encoding="utf-8")
+        stripped, removed = strip_descriptions(source)
+        if removed:
+            # Make sure the rewrite is still valid Python before saving it
+            ast.parse(stripped)
+            path.write_text(stripped, encoding="utf-8")
+            print(f"   - {path.name}: removed {removed} descriptions")
+            total += removed
+
+    print(f"✅ Stripped {total} Field descriptions from {SCHEMAS_DIR}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())